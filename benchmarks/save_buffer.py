@@ -0,0 +1,46 @@
+# time `save_buffer`, `binary_save_buffer` (and reloading) on a big design: 10k shapes, 100k weaves
+# usage: python benchmarks/save_buffer.py [NSHAPES NWEAVES]
+import sys, os, time, tempfile
+import numpy as np
+
+from qwerasdf.shape import Circle, Line, Weave
+from qwerasdf.save import save_buffer, binary_save_buffer, load
+from qwerasdf.store import WeaveIndex
+from qwerasdf.util import Rec
+from qwerasdf.params import params
+
+def big_design(nshapes, nweaves, seed = 0):
+    rng = np.random.default_rng(seed)
+    shapes = []
+    for k in range(nshapes):
+        a, b = rng.normal(size = 2), rng.normal(size = 2)
+        shapes.append(Circle(a, b, ndivs = 60) if k % 2 else Line(a, b, ndivs = 30))
+    weaves, colors = [], {}
+    for _ in range(nweaves):
+        s1, s2 = rng.integers(nshapes, size = 2)
+        we = Weave([ Rec(s = shapes[s1], i = 0), Rec(s = shapes[s2], i = 5) ], 10, (1, 1))
+        weaves.append(we)
+        colors[we] = 'Q'
+    return Rec(shapes = shapes, weaves = weaves, pending_weaves = [], weave_colors = colors, 
+               weave_index = WeaveIndex(weaves), palette = dict(params.start_palette))
+
+def timed(what, f, *a):
+    start = time.perf_counter()
+    ret = f(*a)
+    print(f"{what}: {time.perf_counter() - start:.3f}s")
+    return ret
+
+if __name__ == '__main__':
+    nshapes, nweaves = (int(x) for x in sys.argv[1:3]) if len(sys.argv) > 2 else (10_000, 100_000)
+    cx = timed(f"build {nshapes} shapes, {nweaves} weaves", big_design, nshapes, nweaves)
+    buffer = timed("save_buffer", save_buffer, cx)
+    print(f"  {len(buffer) / 1e6:.1f} MB")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.qw')
+        with open(path, 'w') as f: f.write(buffer)
+        timed("load", load, path)
+        #
+        binary = timed("binary_save_buffer", binary_save_buffer, cx)
+        print(f"  {len(binary) / 1e6:.1f} MB")
+        with open(path, 'wb') as f: f.write(binary)
+        timed("load (binary)", load, path)
@@ -2,7 +2,6 @@ from pygame import *
 import numpy as np
 
 from .params import params, ptol, ltop
-from .util import clamp
 
 # Simple Palette
 # def draw_palette(palette, selected = None, label_color = params.background):
@@ -22,8 +21,11 @@ from .util import clamp
 #         offset += width
 #     return surf
 
-def draw_palette(palette, selected = None, label_color = params.background):
-    _font = font.SysFont(('MonoSpace', None), params.font_size * 15 // 10 )
+def _palette_font():
+    return font.SysFont(('MonoSpace', None), params.font_size * 15 // 10 )
+
+def draw_palette(palette, selected = None, label_color = params.background, _font = None):
+    _font = _font or _palette_font()
     #
     n = len(palette.keys())
     width = _font.size(" X ")[0]
@@ -35,47 +37,52 @@ def draw_palette(palette, selected = None, label_color = params.background):
         surf.blit(box, (offset, 0))
         offset += width
     return surf
+
+class PaletteWidget:
+    # the font lookup and the rendering are costly: keep both, re-render only when the palette or selection change
+    def __init__(self, label_color = params.background):
+        self.font = _palette_font()
+        self.label_color = label_color
+        self.key, self.surf = None, None
+    #
+    def render(self, palette, selected = None):
+        key = ( tuple( (k, tuple(color)) for k, color in palette.items() ), selected )
+        if key != self.key:
+            self.key = key
+            self.surf = draw_palette(palette, selected, self.label_color, self.font)
+        return self.surf
+    ###
     
 # Rainbow Color Picker
 def lerp(t, u, v):
     return (1 - t) * u + t * v 
 
-def rainbow_row(width, lum, sat):
-    rainbow6 = np.array(
-            [[255, 0, 0], [255, 255, 0], [0, 255, 0], [0, 255, 255], [0, 0, 255], [255, 0, 255]])
-    white = np.array([255, 255, 255])
-    black = np.zeros(3)
-    huepoints = np.array([lerp(lum, black, lerp(sat, white, hue)) for hue in rainbow6], dtype = int)
-    sixths = [ 
-            np.linspace(
-                huepoints[i], 
-                huepoints[(i+1)%6], 
-                int((width+i)//6), 
-                endpoint = False,
-                dtype = int)
-            for i in range(6)]
-    return np.concatenate(sixths)
+_rainbow6 = np.array([[255, 0, 0], [255, 255, 0], [0, 255, 0], [0, 255, 255], [0, 0, 255], [255, 0, 255]])
 
-def rainbow_array(width, height, lum, min_sat = 0, max_sat = 1):
-    return np.linspace(
-            rainbow_row(width, lum, min_sat), 
-            rainbow_row(width, lum, max_sat), 
-            height, 
-            axis = 1,
-            dtype = int)
+def rainbow_array(width, height, min_sat = 0, max_sat = 1):
+    '''(width, height, 3) float array: the rainbow at full brightness, hue along x, saturation along y
+    (brightness is linear: multiply by `lum` for other brightnesses)'''
+    counts = [ (width + i) // 6 for i in range(6) ] # columns going from the i-th pure hue to the next
+    sixths = np.repeat(np.arange(6), counts)
+    ts = np.concatenate([ np.arange(n) / n for n in counts ])[:, None]
+    hues = lerp(ts, _rainbow6[sixths], _rainbow6[(sixths + 1) % 6])
+    sats = np.linspace(min_sat, max_sat, height)[None, :, None]
+    return lerp(sats, 255., hues[:, None, :])
 
 class ColorPicker:
     def __init__(self, width, height, corner = (0, 0), min_sat = 0, display_lum = 0.6):
         self.corner = corner
         self.display_lum = display_lum
+        self.base_key = None
         self.reset(width, height, corner, min_sat, display_lum)
     #
     def reset(self, width, height, corner = (0, 0), min_sat = 0, display_lum = 0.6):
         self.corner = corner or self.corner
-        self.display_lum = display_lum
-        self.array = rainbow_array(width, height, display_lum, min_sat, 1.0)
-        self.set_surf(width, height)
-        self.render()
+        if self.base_key != (width, height, min_sat):
+            self.base_key = (width, height, min_sat)
+            self.base = rainbow_array(width, height, min_sat, 1.0)
+            self.set_surf(width, height)
+        self.set_display_lum(display_lum)
         return self
     #
     def set_surf(self, width, height):
@@ -83,27 +90,25 @@ class ColorPicker:
     #
     def get_surf(self): return self.surf
     #
+    def set_display_lum(self, lum):
+        self.display_lum = lum
+        self.render()
+    #
     def render(self):
-        width, height = self.surf.get_size()
-        pix_array = PixelArray(self.surf)
-        for y in range(height):
-            for x in range(width):
-                pix_array[x, y] = Color(self.array[x, y])
-        pix_array.close()
+        surfarray.blit_array(self.surf, (self.base * self.display_lum).astype(np.uint8))
     #
-    def _at_rel_pixel(self, pos, lum = None, clamp = False):
-        lum = lum or self.display_lum
+    def _at_rel_pixel(self, pos, lum = 1, clamp = False):
         width, height = self.surf.get_size()
         x, y = pos
         if clamp:
-            pos = clamp(x, 0, width - 1), clamp(y, 0, height - 1)
+            x, y = min(max(x, 0), width - 1), min(max(y, 0), height - 1)
         elif not (0 <= x < width and 0 <= y < height):
             return None
-        return Color(self.array[x, y] * (1 / lum))
+        return Color(*(self.base[x, y] * lum).astype(int).tolist())
     #
-    def at_pixel(self, pos, clamp = False, corner = None, lum = None):
+    def at_pixel(self, pos, clamp = False, corner = None, lum = 1):
+        "the color under `pos`, at brightness `lum` (the displayed brightness doesn't matter)"
         corner = corner or self.corner
         relpos = pos[0] - corner[0], pos[1] - corner[1]
-        return self._at_rel_pixel(relpos, clamp = clamp)
+        return self._at_rel_pixel(relpos, lum, clamp = clamp)
     ###
-
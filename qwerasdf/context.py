@@ -1,13 +1,13 @@
 import numpy as np
 import os
 
-from pygame import Surface, event
+from pygame import Surface, Color, surfarray, event
 
 from .util import Rec
 from .params import params
 from .save import Autosaver, load
+from .shape import draw_weaves
 from .math_utils import *
-from .shape import bounding_rect
 
 # def snappy_get_point(context, pos):
 #     cx = context
@@ -32,42 +32,27 @@ from .shape import bounding_rect
 #     return np.copy(snappoint), candidates
 # 
 
-# TODO:
-# the way we currently get snappy points for the grid is kinda dumb, bc we generate 
-# all the points and iterate over them,
-# whereas we could do complicated-ish arithmetic in O1 i think, (in a method of Grid)
 def snappy_get_point(context, pos):
     cx = context
-    sq_rrad = cx.view.ptord(params.snap_radius) ** 2
+    rrad = cx.view.ptord(params.snap_radius)
+    sq_rrad = rrad ** 2
     point = cx.view.ptor(pos)
     snappoint = point
     shortest = sq_rrad + params.eps
-    candidates = []
-    def find_shortest(points):
-        # if len(points) == 0 ... are shapes garantueed to have at least a div?
-        rels = points - point
-        rels **= 2
-        [xs, ys] = np.split(rels, 2, axis = 1)
-        sqdists = xs + ys
-        i = np.argmin(sqdists)
-        return i, sqdists[i]
+    # closest nail of every shape near the cursor (+ eps: keep the ones equal to the snappoint)
+    near = cx.nail_index.query(point, rrad + params.eps)
+    if near:
+        d, sh, i = min(near, key = lambda dsi: dsi[0])
+        if d < sq_rrad:
+            snappoint, shortest = sh.divs[i], d
+    if cx.grid_on and (gridpoint := cx.grid.nearest(point, rrad)) is not None:
+        if sqdist(gridpoint, point) < min(sq_rrad, shortest):
+            snappoint = gridpoint
     #
-    for sh in cx.shapes:
-        i, d = find_shortest(sh.divs)
-        #
-        if d < min(sq_rrad, shortest):
-            snappoint, shortest = sh.divs[i], d 
-        if sqdist(snappoint, sh.divs[i]) < params.eps ** 2:
-            candidates.append(Rec(s = sh, i = i))
     #filter candidates, they need to be equal to actual found
-    if cx.grid_on and len(cx.grid.points()) != 0:
-        i, d = find_shortest(cx.grid.points())
-        if d < min(sq_rrad, shortest):
-            snappoint = cx.grid.points()[i] 
-    #
     candidates = [ 
-            cd for cd in candidates 
-            if sqdist(cd.s.divs[cd.i], snappoint) < params.eps ** 2]
+            Rec(s = sh, i = i) for (_, sh, i) in near
+            if sqdist(sh.divs[i], snappoint) < params.eps ** 2]
     return np.copy(snappoint), candidates
 
 def resize_context(context, new_width):
@@ -80,20 +65,112 @@ def resize_context(context, new_width):
 def create_weave(context, weave, color = None):
     context.pending_weaves.append(weave)
     context.weave_colors[weave] = (color or context.color_key)
+    context.weave_index.add(weave)
+#
+def remove_weaves(context, weaves):
+    "`weaves`: set"
+    context.weaves = [ we for we in context.weaves if we not in weaves ]
+    context.pending_weaves = [ we for we in context.pending_weaves if we not in weaves ]
+    for we in weaves: context.weave_colors.pop(we, None)
+    context.weave_index.discard(*weaves)
+    redraw_weaves(context)
 #
 def all_weaves(context):
     return context.weaves + context.pending_weaves
 #
 def redraw_weaves(context):
     context.redraw_weaves = True
+    context.edits += 1 # conservative: most edits (colors, merges...) need a redraw
+#
+def scroll_weaves(context, dx, dy):
+    "the view moved by (`dx`, `dy`) whole pixels: the weave layer can be scrolled instead of redrawn"
+    context.weave_scroll = (context.weave_scroll[0] + dx, context.weave_scroll[1] + dy)
 #
 def set_color(context, color_key, new_color):
-    context.palette[color_key] = new_color
-    context.redraw_weaves = True
+    context.palette[color_key] = new_color # (the weave layer gets recomposited, see `recolor_weave_layer`)
+#
+# WEAVE LAYER COLORS
+# wires are blended over what's below them, so every pixel of the weave layer is a linear mix
+# of the background and the palette colors, with weights that only depend on the geometry.
+# the weights cost a drawing per 3 keys: they are only computed when the colors change again
+# right after a redraw for new colors (picking colors...), once they are, changing colors is a recomposite
+def layer_palette(context, keys):
+    "{k: rgb} the weave layer should show for the weaves drawn with the keys `keys` (see `key_map`)"
+    key_map = context.weave_planes.key_map if context.weave_planes else {}
+    return { k: tuple(context.palette[key_map.get(k, k)])[:3] for k in keys }
+#
+def weave_planes(context):
+    '''Rec(keys, weights, key_map) for the weaves on the weave layer (pending weaves excluded)
+    `weights[k, x, y]`: weight (/255) of the color of `keys[k]` (the last one is the background)
+    `key_map`: current color key of the weaves drawn with `keys[k]` (see `translate_weave_keys`)'''
+    cx = context
+    if cx.weave_planes: return cx.weave_planes
+    keys = sorted({ cx.weave_colors[we] for we in cx.weaves })
+    size = cx.weave_layer.get_size()
+    weights = np.zeros((len(keys) + 1, *size), dtype = np.uint8)
+    # draw the weaves with 3 keys at a time as pure red, green, blue, the rest black: 1 weight per channel
+    scratch, black = Surface(size), Color(0, 0, 0)
+    for first in range(0, len(keys), 3):
+        channels = dict(zip(keys[first:first + 3], (Color(255, 0, 0), Color(0, 255, 0), Color(0, 0, 255))))
+        scratch.fill(black)
+        draw_weaves(scratch, cx.view, cx.weaves, [ channels.get(cx.weave_colors[we], black) for we in cx.weaves ],
+                    antialias = cx.antialias, width = cx.draw_width)
+        weights[first:first + len(channels)] = surfarray.array3d(scratch)[..., :len(channels)].transpose(2, 0, 1)
+    weights[-1] = (255 - weights[:-1].sum(0, dtype = np.int32)).clip(0, 255)
+    cx.weave_planes = Rec(keys = keys, weights = weights, key_map = { k: k for k in keys })
+    return cx.weave_planes
+#
+def weave_layer_changed(context, recolored = False):
+    '''call when the weave layer was (re)drawn: it shows the current palette, the weights are outdated
+    `recolored`: it was only redrawn because the colors changed (see `recolor_weave_layer`)'''
+    context.weave_planes = None
+    context.weave_recolored = recolored
+    keys = { context.weave_colors[we] for we in context.weaves }
+    context.weave_layer_colors = layer_palette(context, keys) # (only the keys in use: other changes are invisible)
+#
+def recolor_weave_layer(context):
+    '''recomposite the weave layer if the colors it should show changed. return whether it did
+    (without weights, asks for a plain redraw instead: see the comment above `layer_palette`)'''
+    cx = context
+    if layer_palette(cx, cx.weave_layer_colors) == cx.weave_layer_colors: return False
+    # (no weights either if the layer gets drawn on this frame anyway)
+    if not cx.weave_planes and not (cx.weave_recolored and not cx.pending_weaves and cx.weave_scroll == (0, 0)):
+        redraw_weaves(cx)
+        return False
+    #
+    planes = weave_planes(cx)
+    current = layer_palette(cx, planes.keys)
+    colors = np.array([ current[k] for k in planes.keys ] + [ tuple(params.background)[:3] ], dtype = np.float32) / 255
+    weights = planes.weights.reshape(len(colors), -1)
+    mix, step = np.empty((weights.shape[1], 3), dtype = np.float32), 1 << 16
+    for start in range(0, len(mix), step): # (by chunks: the float copies of the weights stay small)
+        mix[start:start + step] = weights[:, start:start + step].T @ colors
+    size = planes.weights.shape[1:]
+    surfarray.blit_array(cx.weave_layer, np.rint(mix).clip(0, 255).astype(np.uint8).reshape(*size, 3))
+    cx.weave_layer_colors = current
+    return True
+#
+def translate_weave_keys(context, mapping):
+    '''give the key `mapping[k]` to every weave with key `k`. 
+    only needs a recomposite of the weave layer if the weights are there (see `recolor_weave_layer`)'''
+    cx = context
+    if cx.weave_planes: # (with the keys from before)
+        cx.weave_planes.key_map = { k: mapping.get(k2, k2) for k, k2 in cx.weave_planes.key_map.items() }
+        cx.edits += 1
+    else:
+        redraw_weaves(cx)
+    for we, k in cx.weave_colors.items():
+        if k in mapping: cx.weave_colors[we] = mapping[k]
+#
+def design_generation(context):
+    "changes whenever the saved design may have changed (may also change when it didn't)"
+    return ( context.nail_index.generation, context.weave_index.generation, context.edits,
+             tuple( (k, tuple(c)) for k, c in context.palette.items() ) )
 #
 
 def create_shapes(context, *shapes):
     context.shapes.extend(shapes)
+    context.nail_index.add(*shapes)
     context.selected = list(shapes)
 
 def set_hints(context, *hints):
@@ -105,38 +182,28 @@ def reset_hints(context):
 def post_info(msg, context):
     context.text.write_section('info', [ line.strip() for line in msg.split('\n') ])
     # context.text.write_section('info', [ 'Info: ' + msg ])
+    context.frame.dirty = True # (may come without an event, eg at startup)
 
 def post_error(msg, context):
     context.text.write_section('error', [ 'Error: ' + msg ])
+    context.frame.dirty = True
 
 # Selection actions
 def unweave_inside_selection(context, filter_to_del = None):
     cx = context
-    keep_weaves = []
-    for we in cx.weaves:
-        sh1, sh2 = (hg.s for hg in we.hangpoints)
-        if not (sh1 in cx.selected and sh2 in cx.selected):
-            keep_weaves.append(we)
-        if filter_to_del and not filter_to_del(we):
-            keep_weaves.append(we)
-    cx.weaves = keep_weaves
-    redraw_weaves(cx)
+    inside = cx.weave_index.touching(set(cx.selected), inside = True)
+    remove_weaves(cx, { we for we in inside if not filter_to_del or filter_to_del(we) })
 
 def unweave_into_selection(context):
     cx = context
-    keep_weaves = []
-    for we in cx.weaves:
-        sh1, sh2 = (hg.s for hg in we.hangpoints)
-        if sh1 not in cx.selected and sh2 not in cx.selected:
-            keep_weaves.append(we)
-        else:
-            del cx.weave_colors[we]
-    cx.weaves = keep_weaves
-    redraw_weaves(cx)
+    remove_weaves(cx, set(cx.weave_index.touching(set(cx.selected))))
 
 def delete_selection(context, hints = True):
     unweave_into_selection(context)
-    context.shapes = [ sh for sh in context.shapes if not sh in context.selected ]
+    selected = set(context.selected)
+    context.nail_index.discard(*selected)
+    context.weave_index.forget(*selected)
+    context.shapes = [ sh for sh in context.shapes if not sh in selected ]
     context.selected = []
     if hints:
         reset_hints(context)
@@ -164,6 +231,8 @@ def load_to_context(context, loaded, extra = {}):
     context.selected = []
     #
     context.update(loaded)
+    context.nail_index.reset(context.shapes)
+    context.weave_index.reset(all_weaves(context))
     for k, v in extra.items():
         match k: # only k = session supported now
             case 'session': 
@@ -188,12 +257,16 @@ def toggle_grid(context):
 def copy_weaves_inside(dest_shapes, src_shapes, weave_superset, context,
         create = True, return_colors = False):
     # context needed for colors
+    # `weave_superset` None: all the weaves of `context` (found through its `weave_index`)
     new_weaves = []
     if return_colors: colors = {}
+    position = { sh: i for i, sh in enumerate(src_shapes) }
+    if weave_superset is None:
+        weave_superset = context.weave_index.touching(position, inside = True)
     for we in weave_superset:
         [s1, s2] = [ hg.s for hg in we.hangpoints]
-        try: i1, i2 = src_shapes.index(s1), src_shapes.index(s2)
-        except: continue
+        try: i1, i2 = position[s1], position[s2]
+        except KeyError: continue
         #
         new = we.copy()
         new.hangpoints[0].s, new.hangpoints[1].s = dest_shapes[i1], dest_shapes[i2]
@@ -213,13 +286,13 @@ def stash_selection(context):
 def export_image_window(context, img_conf = None):
     scr, v = context.screen, context.view
     w, h = scr.get_size()
-    corners = [v.ptor([0, h -1]), v.ptor( [w - 1, 0] )] # y inversion weirdness
+    corners = v.ptor_many([ [0, h - 1], [w - 1, 0] ]) # y inversion weirdness
     img_conf = img_conf or context.img_conf
     file = img_conf.save_image(corners, context)
     post_info(f"image successfully exported to '{file}'", context)
 
 def export_image_whole(context, img_conf = None, margin = params.image_margin):
-    corners = ar(bounding_rect(*context.shapes))
+    corners = ar(context.nail_index.bounds())
     [left, bottom], [right, top] = corners
     margin_x = margin / 2 * (right - left)
     margin_y = margin / 2 * (top - bottom)
@@ -31,7 +31,7 @@ class Grid:
         self.fade_factor = params.grid_fade_factor
         #
         self._render = None
-        self._points = np.array([]).reshape((-1, 2))
+        self._finest = None # (dr, dt) of the finest graduations
     #
     def asubdiv(self, index):
         return take( iter_subdiv(self.asubdivs), index + 1)[-1]
@@ -50,7 +50,7 @@ class Grid:
             else: return True
         #
         corners = ar([[0, 0], [0, 1], [1, 0], [1, 1]]) * ar([x-1 for x in dims])
-        corners = ar([ v.ptor(p) for p in corners])
+        corners = v.ptor_many(corners)
         #
         # find rmin, rmax, tmin, tmax where:
         # rmin, rmax are the bounds of the circle ring encompassing the screen
@@ -104,42 +104,43 @@ class Grid:
             min_fade = 1 / 20 
             #
             # note: reverse so brighter graduations get drawn above
-            [x_c, y_c] = v.rtop(self.center)
+            pcenter = v.rtop(self.center)
+            [x_c, y_c] = pcenter
             for lv, grad in reversed([*enumerate(rgrads)]):
                 color = color_lerp(min_fade + (1-min_fade)*self.fade_factor ** lv, bg, fg)
-                for r in np.arange(first_above(rmin, grad), rmax, grad):
-                    r_pix = v.rtopd(r)
+                r_pixs = v.rtopd_many(np.arange(first_above(rmin, grad), rmax, grad))
+                for r_pix in r_pixs.tolist():
                     arc_rect = pg.Rect(x_c - r_pix, y_c - r_pix, 2 * r_pix, 2 * r_pix)
                     pg.draw.arc(surf, color, arc_rect, tmin, tmax)
             #
             for lv, arc in reversed([*enumerate(agrads)]):
                 color = color_lerp(min_fade + (1-min_fade)*self.fade_factor ** lv, bg, fg)
-                for angle in ph + np.arange(first_above(tmin - ph, arc), tmax - ph, arc):
-                    start = self.center + rmin * ar([np.cos(angle), np.sin(angle)])
-                    end = self.center + rmax * ar([np.cos(angle), np.sin(angle)])
-                    pg.draw.line(surf, color, v.rtop(self.center), v.rtop(end))
+                angles = ph + np.arange(first_above(tmin - ph, arc), tmax - ph, arc)
+                ends = self.center + rmax * ar([ np.cos(angles), np.sin(angles) ]).transpose()
+                for pend in v.rtop_many(ends).tolist():
+                    pg.draw.line(surf, color, pcenter, pend)
         self._render = render
         #
         if not rgrads or not agrads:
-            self._points = ar([]).reshape((-1, 2))
-            return
-        dr, dt = rgrads[-1], agrads[-1]
-        r0 = first_above(rmin, dr)
-        # TODO? maybe hande r = 0 (when center is inside) specially
-        nrings = (rmax - r0) // dr
-        if nrings < 0: nrings = 0
-        #
-        angles = ph + np.arange(first_above(tmin - ph, dt), tmax - ph, dt)
-        units = ar([ np.cos(angles), np.sin(angles) ]).transpose()
-        small_arc = self.center + r0 * units
-        big_arc = self.center + (r0 + (nrings - 1) * dr) * units
-        #
-        self._points = np.linspace(small_arc, big_arc, int(nrings)).reshape((-1, 2))
+            self._finest = None
+        else:
+            self._finest = rgrads[-1], agrads[-1]
     #
     def render(self, surf, bg, fg):
         if not self._render: return
         return self._render(surf, bg, fg)
     #
-    def points(self):
-        return self._points 
+    def nearest(self, point, radius):
+        '''closest ring/spoke intersection to `point`, or None if further than `radius`
+        O(1): uses the finest graduations found by the last `update`'''
+        if not self._finest: return None
+        dr, dt = self._finest
+        [x, y] = point - self.center
+        r, t = np.hypot(x, y), atan2(y, x)
+        # closest spoke by angle, then closest ring on it (projection of `point` on the spoke)
+        spoke = self.phase + dt * round((t - self.phase) / dt)
+        ring = dr * max(round(r * np.cos(t - spoke) / dr), 0)
+        nearest = self.center + ring * np.array([np.cos(spoke), np.sin(spoke)])
+        if dist(nearest, point) > radius: return None
+        return nearest
 
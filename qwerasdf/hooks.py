@@ -8,6 +8,7 @@ from .miniter import miniter_exec
 from .context import *
 from .util import param_decorator, clamp
 from .merge import merge_into # TODO restructure module
+from .spatial import NailIndex
 from .math_utils import *
 from . import save
 
@@ -17,6 +18,7 @@ class EvHook:
         self.attached = []
         self.watched = set()
         self.cleanup = lambda: None
+        self.redraws = True # handling an event may change the frame (see `EvDispatch.dispatch`)
         #
         self.filter = None
         self.dispatch = None
@@ -81,8 +83,14 @@ class EvDispatch: # event dispatcher
     def all_watched(self):
         return set(self.callstacks.keys())
     #
+    def watches(self, evtype):
+        "is an active hook watching `evtype`"
+        return any( hk.active() for hk in self.callstacks.get(evtype, []) )
+    #
     def dispatch(self, events):
-        for ev in events:
+        "return whether a hook that `redraws` handled one of `events`"
+        redraw = False
+        for ev in coalesce_motion(events):
             if not ev.type in self.callstacks:
                 continue
             # filter out finished
@@ -94,12 +102,27 @@ class EvDispatch: # event dispatcher
                 for hk in reversed(hooks):
                     if (not hk.filter) or (hk.filter(ev)):
                         hk.call_once(ev);
+                        redraw = redraw or hk.redraws
                         break
             else: 
                 del self.callstacks[ev.type]
-        #
+        return redraw
     ###
 
+def coalesce_motion(events):
+    '''replace each run of consecutive MOUSEMOTION events by its last one (with summed `rel`)
+    avoids handling (snapping, rebuilding hints...) positions that will never be drawn
+    other events (clicks, keys...) keep their order relative to the motions'''
+    out = []
+    for ev in events:
+        if ev.type == pg.MOUSEMOTION and out and out[-1].type == pg.MOUSEMOTION:
+            prev = out[-1]
+            rel = (prev.rel[0] + ev.rel[0], prev.rel[1] + ev.rel[1])
+            out[-1] = pg.event.Event(pg.MOUSEMOTION, {**ev.dict, 'rel': rel})
+        else:
+            out.append(ev)
+    return out
+
 # Hook type decorators
 @param_decorator
 def loop_hook(f, watched, cleanup = None, setup = None):
@@ -175,11 +198,12 @@ _AUTOSAVE = pg.event.custom_type()
 # Rewind
 def _autosave_setup(hook, context):
     pg.time.set_timer(_AUTOSAVE, params.autosave_pulse * 1000)
+    hook.redraws = False # (errors are posted, which marks the frame dirty)
 @loop_hook(  {_AUTOSAVE}, 
              cleanup = lambda: pg.time.set_timer(_AUTOSAVE, 0),
              setup = _autosave_setup )
 def autosave_hook(hook, ev, context):
-    if context.autosaver: context.autosaver.savepoint(context)
+    if context.autosaver: context.autosaver.savepoint(context, design_generation(context))
 
 LOOP = pg.event.custom_type()  # TODO where should this be declared for cleaner?
 @loop_hook({pg.MOUSEBUTTONDOWN, pg.MOUSEWHEEL, LOOP})
@@ -221,12 +245,21 @@ def click_move_hook(hook, context):
         v.corner += rstart - v.ptor(pos)
         redraw_weaves(context)
     #
+    def pan(pos):
+        # while dragging: move by whole pixels, the weave layer is just scrolled (redrawn on release)
+        nonlocal plast
+        v, (dx, dy) = context.view, (pos[0] - plast[0], pos[1] - plast[1])
+        v.corner += ar((-dx, dy)) / v.ppu
+        scroll_weaves(context, dx, dy)
+        plast = pos
+    #
     while True:
         pstart, rstart = None, None
         #
         ev = yield
         pstart, rstart = ev.pos, context.view.ptor(ev.pos)
-        hook.event_loop(lambda ev: move_view(ev.pos))
+        plast = pstart
+        hook.event_loop(lambda ev: pan(ev.pos))
         #
         ev = yield
         hook.event_loop(None)
@@ -516,13 +549,13 @@ def color_picker_hook(hook, ev, context, *, _state):
             _state.save_color = color
         case _, color:
             cx.palette[cx.color_key] = color
-    redraw_weaves(cx)
 
 
 # Selection 
 def toggle_select(context, shapes):
-    keep = [sh for sh in context.selected if not sh in shapes]
-    add = [sh for sh in shapes if not sh in context.selected]
+    shapes_set, selected_set = set(shapes), set(context.selected)
+    keep = [sh for sh in context.selected if not sh in shapes_set]
+    add = [sh for sh in shapes if not sh in selected_set]
     context.selected = keep + add
 
 @loop_hook({ pg.MOUSEBUTTONDOWN, pg.MOUSEMOTION }, lambda context: reset_hints(context))
@@ -549,13 +582,9 @@ def rectangle_select_hook(hook, context, strict = False):
         [[x1, y1], [x2, y2]] = corners
         vmin = [min(x1, x2) - eps, min(y1, y2) - eps]
         vmax = [max(x1, x2) + eps, max(y1, y2) + eps]
-        def criterion(sh):
-            post_min = (vmin <= sh.divs).all(1)
-            pre_max =  (sh.divs <= vmax).all(1)
-            if needs_every: return np.all( post_min & pre_max )
-            else:           return np.any( post_min & pre_max )
-        #
-        return [ sh for sh in cx.shapes if criterion(sh) ]
+        nails = cx.nail_index.pack().buffer
+        inside = ((vmin <= nails) & (nails <= vmax)).all(1)
+        return cx.nail_index.shapes_where(inside, every = needs_every)
     #
     def hints(corners):
         return find_touched(corners) + [rectangle(corners)]
@@ -632,17 +661,17 @@ def move_selection_hook(hook, context):
             case ms.LCLICK:
                 for sh in cx.selected:
                     sh.move(pos - start_pos)
-                cx.shapes, cx.selected = merge_into(cx.shapes, cx.selected, cx.weaves)
+                cx.shapes, cx.selected = merge_into(cx.shapes, cx.selected, cx.weaves, cx.nail_index, cx.weave_index)
                 #
                 redraw_weaves(cx)
                 hook.finish()
             case ms.MOTION:
-                cx.hints = [ sh.moved(pos - start_pos) for sh in cx.selected ]
+                cx.hints = [ TransformedHint(cx.selected, offset = pos - start_pos) ]
             case pg.KEYDOWN:
                 if alpha_scan(ev) == 'F':
                     new_shapes = [ sh.moved(pos - start_pos) for sh in cx.selected ]
-                    new_weaves = copy_weaves_inside( new_shapes, cx.selected, cx.weaves, cx)
-                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves)
+                    new_weaves = copy_weaves_inside( new_shapes, cx.selected, None, cx)
+                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves, cx.nail_index, cx.weave_index)
                     start_pos = pos
     #
     hook.event_loop(inner)
@@ -653,7 +682,7 @@ def transform_selection_hook(hook, context):
     steal_menu_keys(hook, cx.menu, 'QWASDF', 
             {'A': "Flip", 'S': "+Rotation", 'D': "-Rotation", 'F': "Put Copy"})
     def transformed_selection(matrix, center):
-        return [ sh.transformed(matrix, center) for sh in cx.selected ]
+        return transform_shapes(cx.selected, matrix, center)
     #
     rot_angle = 0.
     mirror = False
@@ -674,20 +703,19 @@ def transform_selection_hook(hook, context):
             case ms.RCLICK: hook.finish()
             case pg.KEYDOWN:
                 if alpha_scan(ev) == 'F':
-                    new_shapes = [ sh.transformed(matrix, center) for sh in cx.selected ]
+                    new_shapes = transformed_selection(matrix, center)
                     new_weaves = copy_weaves_inside(
-                            new_shapes, cx.selected, cx.weaves, cx)
-                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves)
+                            new_shapes, cx.selected, None, cx)
+                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves, cx.nail_index, cx.weave_index)
                     redraw_weaves(cx)
             case ms.LCLICK:
-                for sh in cx.selected:
-                    sh.transform(matrix, center);
-                cx.shapes, cx.selected = merge_into(cx.shapes, cx.selected, cx.weaves)
+                transform_shapes(cx.selected, matrix, center, copy = False)
+                cx.shapes, cx.selected = merge_into(cx.shapes, cx.selected, cx.weaves, cx.nail_index, cx.weave_index)
                 #
                 redraw_weaves(cx)
                 hook.finish()
         if hook.active():
-            cx.hints = [ sh.transformed(matrix, center) for sh in cx.selected ]
+            cx.hints = [ TransformedHint(cx.selected, matrix, center) ]
     #
     hook.event_loop(inner)
 
@@ -727,35 +755,32 @@ def interactive_transform_hook(hook, context):
             case "recenter": center = pos
             case "apply change":
                 if pendingT:
-                    for sh in cx.selected:
-                        pendingT(pos, sh, copy = False)
-                    cx.shapes, cx.selected = merge_into(cx.shapes, cx.selected, cx.weaves)
+                    pendingT(pos).apply(copy = False)
+                    cx.shapes, cx.selected = merge_into(cx.shapes, cx.selected, cx.weaves, cx.nail_index, cx.weave_index)
                     redraw_weaves(cx)
                     pendingT = None
             case "put copy":
                 if pendingT:
-                    new_shapes = [pendingT(pos, sh, copy = True) for sh in cx.selected]
-                    new_weaves = copy_weaves_inside(new_shapes, cx.selected, cx.weaves, cx)
-                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves)
+                    new_shapes = pendingT(pos).apply()
+                    new_weaves = copy_weaves_inside(new_shapes, cx.selected, None, cx)
+                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves, cx.nail_index, cx.weave_index)
                     redraw_weaves(cx)
                     pendingT = None
         ##
         def apply_matrix(f):
             nonlocal pendingT
-            def wrapped(to, sh, copy = True):
+            def wrapped(to):
                 try: matrix = f(to)
                 except ZeroDivisionError: matrix = np.identity(2)
                 #
-                if copy: return sh.transformed(matrix, center)
-                else: sh.transform(matrix, center)
+                return TransformedHint(cx.selected, matrix, center)
             pendingT = wrapped
         # Set current transformation (parametrized by current pos)
         match action(ev):
             case "move":
                 start = pos
-                def _do_move(to, sh, copy = True):
-                    if copy: return sh.moved(to - start)
-                    else: sh.move(to - start)
+                def _do_move(to):
+                    return TransformedHint(cx.selected, offset = to - start)
                 pendingT = _do_move
             case "rotate":
                 start = pos
@@ -795,7 +820,8 @@ def interactive_transform_hook(hook, context):
                             assume_unit = True)
                     return rend / rstart * rot_matrix(vangle, assume_unit = True)
         # Set hints (show pending change)
-        if pendingT: set_hints(cx, *[pendingT(pos, sh, copy = True) for sh in cx.selected])
+        # (`pendingT(pos)`: the pending change as a hint, `.apply()` to actually do it)
+        if pendingT: set_hints(cx, pendingT(pos))
         else: set_hints(cx, Point(pos))
     ###
 
@@ -827,7 +853,7 @@ def unstash_hook(hook, context):
         if st.grabbed is None:
             set_hints(cx, *stash_context.shapes, Point(pos))
         else:
-            set_hints(cx, *[sh.moved(pos - st.grabbed) for sh in stash_context.shapes])
+            set_hints(cx, TransformedHint(stash_context.shapes, offset = pos - st.grabbed))
     def incr_pos(incr):
         st.i = clamp(st.i + incr, 0, len(cx.stash) - 1)
         st.grabbed, st.reload = None, True
@@ -840,6 +866,7 @@ def unstash_hook(hook, context):
             stash_context.update(cx.stash[st.i])
             weave_source = stash_context.shapes
             stash_context.shapes = [ sh.moved(pos) for sh in stash_context.shapes ]
+            stash_context.nail_index = NailIndex(stash_context.shapes)
             st.reload = False
         draw_hints()
         ev = yield
@@ -859,7 +886,7 @@ def unstash_hook(hook, context):
                             create = False, return_colors = True )
                     for we in new_weaves:
                         create_weave(cx, we, new_colors[we])
-                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves)
+                    cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves, cx.nail_index, cx.weave_index)
 
 # Miniter
 def miniter_hook(hook, context, cmd = ''):
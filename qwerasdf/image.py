@@ -4,13 +4,13 @@ from os import path
 
 from .params import params
 from .view import View
+from .shape import draw_weaves
 
 def draw(surf, view, context):
     cx = context
     if 'weaves' not in cx.hide:
-        for we in cx.weaves: 
-            ckey = cx.weave_colors[we]
-            we.draw(surf, view, color = cx.palette[ckey], antialias = cx.antialias, width = cx.draw_width)
+        draw_weaves(surf, view, cx.weaves, [ cx.palette[cx.weave_colors[we]] for we in cx.weaves ],
+                    antialias = cx.antialias, width = cx.draw_width)
     #
     if 'shapes' not in cx.hide:
         for sh in cx.shapes:
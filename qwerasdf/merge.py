@@ -1,31 +1,64 @@
+import numpy as np
+
+from .params import params
+
+def _cell(point, q):
+    return tuple(np.floor(point / q).astype(int).tolist())
+
 # problem this all merge thing doesn't handle the case when 2 weaves overlap
 # too hard to detect
-def merge_into(dest, src, weaves):
-    dest = [ sh for sh in dest if sh not in src ]
-    to_append, touched = [], []
+def merge_into(dest, src, weaves, nail_index = None, weave_index = None):
+    # `nail_index`, `weave_index`: if given, kept in sync with the returned shapes (and moved weaves)
+    # shapes that can merge share their `merge_key` (type, ndivs) and (up to eps) their `merge_anchor`
+    # so candidates are looked up by quantised anchor (in the 3x3 cells around it)
+    # instead of trying `merger` against every shape of `dest`
+    srcset = set(src)
+    dest = [ sh for sh in dest if sh not in srcset ]
+    q = 2 * params.eps # cell size. (any >= eps works)
+    index = {}
+    for pos, target in enumerate(dest):
+        index.setdefault((target.merge_key(), _cell(target.merge_anchor(), q)), []).append(pos)
+    # weaves hanging on the shapes of `src`, by (shape, which end)
+    attached_to = {}
+    for we in weaves:
+        for which in (0, 1):
+            if (s := we.hangpoints[which].s) in srcset:
+                attached_to.setdefault((s, which), []).append(we)
+    #
+    to_append, touched, merged, moved = [], [], [], []
     for sh in src:
-        for target in dest:
+        key, (i, j) = sh.merge_key(), _cell(sh.merge_anchor(), q)
+        candidates = sorted( pos for dx in (-1, 0, 1) for dy in (-1, 0, 1) 
+                             for pos in index.get((key, (i + dx, j + dy)), ()) )
+        for target in (dest[pos] for pos in candidates):
             if (f := sh.merger(target)):
                 # find weaves on `sh`
                 # transform them using f to put them on target
                 # don't include `sh` in shapes to be added
                 # do twice because attach-point may be at index 0 or 1
                 for which in (0, 1):
-                    attached = [we for we in weaves if we.hangpoints[which].s == sh]
-                    for we in attached:
+                    for we in attached_to.get((sh, which), ()):
                         hg = we.hangpoints[which]
                         #
                         we.incrs = we.incrs[not which], f(hg.i + we.incrs[which]) - f(hg.i)
                         if not which: we.incrs = we.incrs[1], we.incrs[0]
                         #
                         hg.s, hg.i = target, f(hg.i)
+                        moved.append(we)
                 #
                 touched.append(target)
+                merged.append(sh)
                 break
         else:
             to_append.append(sh)
     #
     dest += to_append
+    if nail_index is not None:
+        nail_index.discard(*merged)
+        nail_index.add(*to_append)
+    if weave_index is not None:
+        weave_index.add(*moved)
+        weave_index.forget(*merged)
     return dest, to_append + touched
     ##
 
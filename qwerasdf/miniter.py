@@ -11,6 +11,7 @@ from .context import *
 from . import printpoints
 from .math_utils import *
 from .merge import merge_into
+from .shape import set_divs_many, transform_shapes
 from .image import ImageConf
 
 # set by `miniter_command` decorator
@@ -166,7 +167,7 @@ def save_cmd(*a, _env):
         overwrite_ok = (a[-1] == '!')
         #
         buffer = save_buffer(_env.context, extra = {'session'})
-        write_save(save_path(file), buffer, overwrite_ok = overwrite_ok, header = True)
+        save(save_path(file), _env.context, overwrite_ok = overwrite_ok, buffer = buffer)
         post_info( f"successfully saved as '{file}'", _env.context )
         #
         _env.context.last_save_buffer = buffer
@@ -236,7 +237,7 @@ def exit_cmd(save_or_bang = None, *, _env):
         raise CmdExn(f"Quitting would discard changes. Use '{_env.cmd} !' to ignore")
     #
     if save_or_bang and save_or_bang != '!':
-        write_save(save_path(save_or_bang), buffer, header = True)
+        save(save_path(save_or_bang), cx, buffer = buffer)
     _env.context.QUIT = True
 
 @miniter_command(('new', 'blank'), "$CMD || $CMD ! || $CMD SAVENAME")
@@ -248,13 +249,15 @@ def new_design_cmd(save_or_bang = None, *, _env):
     if not save_or_bang and not same:
         raise CmdExn(f"Would discard changes. Use '{_env.cmd} !' or '{_env.cmd} savename'")
     if save_or_bang and save_or_bang != '!':
-        write_save(save_path(save_or_bang), buffer, overwrite_ok = True, header = True)
+        save(save_path(save_or_bang), _env.context, overwrite_ok = True, buffer = buffer)
     cx = _env.context
     cx.selected = []
     cx.shapes = []
+    cx.nail_index.reset()
     cx.hints = []
     cx.weaves = []
     cx.weave_colors = {}
+    cx.weave_index.reset()
     reset_menu(cx)
     _env.context.last_save_buffer = ''
     _last_save_filename = None
@@ -288,7 +291,7 @@ def export_outline_cmd(width, margin, paper = 'a4', *, _env):
     '''$CMD WIDTH_CM MARGIN_CM: generate multi-page printable outline for drawing.
        (cf. manual. (Saving section))'''
     us_letter = (paper.lower() == 'us-letter')
-    points = np.concatenate([sh.divs for sh in _env.context.shapes])
+    points = _env.context.nail_index.pack().buffer
     ps_buffer = printpoints.generate(points, width, margin, us_letter)
     file = os.path.join(params.exports_directory, 'out.ps')
     with open(file, 'w') as out:
@@ -367,8 +370,8 @@ def set_div_cmd(n, *, _env):
     if not ( 0 < n <= params.max_div) :
         raise CmdExn(f"number must be between 1 and {params.max_div}")
     unweave_into_selection(_env.context)
-    for sh in _env.context.selected:
-        sh.set_divs(n)
+    set_divs_many(_env.context.selected, n)
+    _env.context.nail_index.update(*_env.context.selected)
 
 @miniter_command( ('default-divs', 'dfdiv', 'dfnails'), "$CMD SHAPE_TYPE1 DEFAULT_NAILS1 ...")
 def set_default_divs_cmd(*args, _env):
@@ -539,31 +542,46 @@ def clear_cmd(*, _env):
     for section in {'info', 'error'}:
         _env.context.text.write_section(section, [])
 
+@miniter_command(('frame-stats', 'fstat'), "$CMD || $CMD reset")
+def frame_stats_cmd(reset = None, *, _env):
+    '''$CMD      : tell how many frames were drawn, and how long they took vs the frame budget
+       $CMD reset: reset the counters'''
+    st = _env.context.frame.stats
+    if reset == 'reset':
+        st.drawn, st.waits, st.time, st.worst = 0, 0, 0, 0
+        return
+    mean = st.time / st.drawn if st.drawn else 0
+    post_info(f"frames drawn: {st.drawn}, idle waits: {st.waits}\n"
+              f"draw time: mean {mean:.2f}ms, worst {st.worst:.2f}ms (budget {1000 / params.fps:.2f}ms)", 
+              _env.context)
+
 @miniter_command(('select-all', 'sel*'))
 def select_all_cmd(*, _env):
     "$CMD: select all shapes"
     _env.context.selected = _env.context.shapes[:]
 
-def _translate_colors(src, dest, weaves, selected, cx):
+def _color_translation(src, dest, cx):
+    "{from: to} (keys, for the first occurence of `from` in `src`)"
     src, dest = (''.join(ltop(k) for k in ks) for ks in (src.upper(), dest.upper()))
-    for i, we in enumerate(weaves):
-        [s1, s2] = [hg.s for hg in we.hangpoints]
-        if not (s1 in selected and s2 in selected):
-            continue
-        #
-        try:
-            key_index = src.index(cx.weave_colors[we])
-            if (color := dest[key_index]) in cx.palette:
-                cx.weave_colors[we] = dest[key_index]
-        except: pass
+    return { k: k2 for i, (k, k2) in enumerate(zip(src, dest)) if src.index(k) == i and k2 in cx.palette }
+
+def _translate_colors(src, dest, selected, cx):
+    mapping = _color_translation(src, dest, cx)
+    for we in cx.weave_index.touching(set(selected), inside = True):
+        if (k := cx.weave_colors[we]) in mapping:
+            cx.weave_colors[we] = mapping[k]
 
 @miniter_command(('translate-colors', 'trans'), "$CMD FROM TO  (example: $CMD qw az)")
 def translate_colors_cmd(src, dest, *, _env):
     '''$CMD FROM TO: change the colors of the weaves inside the selection according to conversion rule
        ex: if FROM = Q and TO = A, weaves with color Q will turn to color A'''
     cx = _env.context
-    _translate_colors(src, dest, cx.weaves, cx.selected, cx)
-    redraw_weaves(_env.context)
+    inside = cx.weave_index.touching(set(cx.selected), inside = True)
+    if set(all_weaves(cx)) <= set(inside): # every weave is translated: recoloring is enough
+        translate_weave_keys(cx, _color_translation(src, dest, cx))
+    else:
+        _translate_colors(src, dest, cx.selected, cx)
+        redraw_weaves(_env.context)
 
 @miniter_command(('unweave-color', 'unco'), "$CMD COLORKEYS")
 def unweave_colors_cmd(*colorkeys, _env):
@@ -578,22 +596,16 @@ def raise_colors_cmd(*colorkeys, _env):
     '''$CMD COLORS: raise weaves inside the selection of certain colors on top
        (last on top)'''
     cx = _env.context
-    weaves = all_weaves(cx)
     ks = ''.join(colorkeys).upper()
     ks = ''.join([ltop(k) for k in ks])
-    weaves_by_color = {**{k: [] for k in ks}, '_':[]}
-    for we in weaves:
-        s1, s2 = (hg.s for hg in we.hangpoints)
-        if (
-            s1 in cx.selected and s2 in cx.selected 
-            and (k := cx.weave_colors[we]) in weaves_by_color
-        ):
+    weaves_by_color = {k: [] for k in ks}
+    for we in cx.weave_index.touching(set(cx.selected), inside = True):
+        if (k := cx.weave_colors[we]) in weaves_by_color:
             weaves_by_color[k].append(we)
-        else:
-            weaves_by_color['_'].append(we)
-    cx.weaves = []
-    for k in '_' + ks:
-        cx.weaves.extend(weaves_by_color[k])
+    raised = [ we for k in weaves_by_color for we in weaves_by_color[k] ]
+    raised_set = set(raised)
+    cx.weaves = [ we for we in all_weaves(cx) if we not in raised_set ] + raised
+    cx.weave_index.to_top(raised)
     redraw_weaves(cx)
 
 @miniter_command(('symmetrize', 'sym'), "$CMD PATTERN? COLORSFROM? COLORSTO?")
@@ -621,12 +633,12 @@ def symmetrize_cmd(*a, _env):
     # if s: mirror (hz) once, square colors permutation
     if rs == 's':
         mat = mirror_matrix(float(cx.grid.phase))
-        new_shapes = [ sh.transformed(mat, cx.grid.center) for sh in cx.selected ]
+        new_shapes = transform_shapes(cx.selected, mat, cx.grid.center)
         new_weaves = copy_weaves_inside(
-                new_shapes, cx.selected, all_weaves(cx), cx)
-        cx.shapes, new_shapes = merge_into(cx.shapes, new_shapes, new_weaves)
+                new_shapes, cx.selected, None, cx)
+        cx.shapes, new_shapes = merge_into(cx.shapes, new_shapes, new_weaves, cx.nail_index, cx.weave_index)
         #
-        _translate_colors(src, dest, all_weaves(cx), new_shapes, cx)
+        _translate_colors(src, dest, new_shapes, cx)
         cx.selected += new_shapes
         #
         colormap = { x: y for x, y in zip(src, dest) }
@@ -638,15 +650,15 @@ def symmetrize_cmd(*a, _env):
     i = 1
     while (i * k % n != 0):
         i += 1
-        new_shapes = [ sh.transformed(rot, cx.grid.center) for sh in cx.selected ]
+        new_shapes = transform_shapes(cx.selected, rot, cx.grid.center)
         new_weaves = copy_weaves_inside(
-                new_shapes, cx.selected, all_weaves(cx), cx)
+                new_shapes, cx.selected, None, cx)
         # ^^ possible optimisation, pass previous new_weaves
-        cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves)
+        cx.shapes, cx.selected = merge_into(cx.shapes, new_shapes, new_weaves, cx.nail_index, cx.weave_index)
         #
         touched.extend(cx.selected)
         #
-        _translate_colors(src, dest, all_weaves(cx), cx.selected, cx)
+        _translate_colors(src, dest, cx.selected, cx)
     #
     cx.selected = touched
     redraw_weaves(cx)
@@ -77,6 +77,10 @@ params.min_ppu = 1
 params.image_margin = 0.05
 
 params.autosave_pulse = 2
+params.binary_saves = False # write saves in the binary format (faster, not human readable)
+
+params.fps = 60
+params.idle_wait = 1000 # ms, max time to block waiting for events when nothing moves
 params.autosave_rotorctl = [ (30, 3) ] * 5 + [ 30 ]
 
 params.initial_stash_cap = 8
@@ -130,6 +134,13 @@ def rfloat(s, min = 1e-6, max = 1e6):
     except:
         raise CastExn("{min} <= float <= {max}")
 
+@cast
+def rbool(s):
+    try:
+        return {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}[s.lower()]
+    except:
+        raise CastExn("bool (true or false)")
+
 @cast
 def rkeymap(s):
     try:
@@ -145,6 +156,7 @@ def rpath(s):
 def _read_conf():
     setable_to_type = {
             'exports_directory': rpath(),
+            'binary_saves': rbool(),
             #
             'background': rcolor(),
             #
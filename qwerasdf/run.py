@@ -1,19 +1,24 @@
 from pygame import *
 from math import pi
 from os import path
+from time import perf_counter
 
-from .util import eprint
-from .color import draw_palette, ColorPicker
+from .util import eprint, Rec
+from .color import PaletteWidget, ColorPicker
 from .hooks import EvDispatch
 from .text import TextArea
 from .hooks import *
 from .context import delete_selection, unweave_inside_selection, MENU_RESET
+from .context import recolor_weave_layer, weave_layer_changed
 from .menu import Menu
 from .save import Autosaver, save_path, save, save_buffer
 from .params import params, ptol
 from .grid import Grid
+from .spatial import NailIndex
+from .store import WeaveIndex
 from .stash import Stash
 from .image import ImageConf
+from .shape import draw_weaves, draw_wires, weave_wires, union_rect
 
 _sho = Menu.Shortcut
 _menu_layout = ['QWER', 'ASDF', 'ZXCV']
@@ -147,6 +152,8 @@ def init_context(dimensions):
     cx.dispatch = EvDispatch()
     #
     cx.shapes = []
+    cx.nail_index = NailIndex()
+    cx.weave_index = WeaveIndex()
     cx.selected = []
     cx.hints = []
     #
@@ -154,6 +161,9 @@ def init_context(dimensions):
     cx.weave_colors = {}
     cx.pending_weaves = []
     cx.redraw_weaves = True
+    cx.weave_planes, cx.weave_layer_colors, cx.weave_recolored = None, {}, False # see `recolor_weave_layer`
+    cx.weave_scroll, cx.pan_wires = (0, 0), None # see `scroll_weave_layer`
+    cx.edits = 0 # see `design_generation`
     cx.weavity = (1, 1)
     cx.weaveback = True
     #
@@ -164,6 +174,7 @@ def init_context(dimensions):
     cx.palette = params.start_palette
     cx.color_key = 'Q'
     cx.show_palette = True
+    cx.palette_widget = PaletteWidget()
     cx.color_picker = ColorPicker(dimensions[0], dimensions[0] // 8, (0, 0), params.min_pick_saturation) 
     cx.show_picker = False
     #
@@ -181,6 +192,12 @@ def init_context(dimensions):
     #
     cx.view = View(corner = (-1, 1))
     cx.weave_layer = Surface(dimensions)
+    cx.shape_layer = Surface(dimensions, SRCALPHA)
+    cx.shape_layer_key = None
+    cx.grid_layer = Surface(dimensions, SRCALPHA)
+    # what was drawn last frame, to only update the display where needed
+    cx.frame = Rec(key = None, overlay = Rect(0, 0, 0, 0), widgets = [], dirty = True)
+    cx.frame.stats = Rec(drawn = 0, waits = 0, time = 0, worst = 0) # draw times in ms
     #
     cx.default_rotation = 2 * pi / 6
     #
@@ -207,6 +224,159 @@ def init_context(dimensions):
     cx.img_conf = ImageConf(params.start_dimensions[1], 'png', params.exports_directory)
     return cx
 
+def update_weave_layer(context):
+    "draw pending weaves on the weave layer (or everything if `redraw_weaves`), return changed Rect"
+    g = context
+    changed = Rect(0, 0, 0, 0)
+    recolored = False
+    if not g.redraw_weaves:
+        if recolor_weave_layer(g): # only the palette changed
+            changed = g.weave_layer.get_rect()
+        recolored = g.redraw_weaves and not g.pending_weaves and g.weave_scroll == (0, 0) # (a redraw for colors)
+    if not g.redraw_weaves and g.weave_scroll != (0, 0): # only the view moved, by whole pixels
+        changed = scroll_weave_layer(g)
+    g.weave_scroll = (0, 0)
+    drawn = g.redraw_weaves or bool(g.pending_weaves)
+    g.weave_layer.lock()
+    if g.redraw_weaves:
+        g.weave_layer.fill(params.background)
+        g.weaves += g.pending_weaves
+        g.weaves, g.pending_weaves = [], g.weaves
+        g.redraw_weaves = False
+        g.pan_wires = None
+        changed = g.weave_layer.get_rect()
+    rect = draw_weaves(
+            g.weave_layer, g.view, g.pending_weaves,
+            [ g.palette[g.weave_colors[we]] for we in g.pending_weaves ],
+            antialias = g.antialias, width = g.draw_width)
+    g.weaves += g.pending_weaves
+    g.weave_layer.unlock()
+    g.pending_weaves = []
+    if drawn: weave_layer_changed(g, recolored) # (once the drawn weaves are in `weaves`)
+    return union_rect(changed, rect)
+
+def scroll_weave_layer(context):
+    '''scroll the weave layer by `weave_scroll` and only draw the newly exposed strips.
+    the wires are converted to pixels once per pan and then only offset,
+    so the strips line up with the scrolled pixels (a real redraw can round differently). 
+    return the changed Rect'''
+    g = context
+    (dx, dy), layer = g.weave_scroll, g.weave_layer
+    (w, h) = layer.get_size()
+    if abs(dx) >= w or abs(dy) >= h: 
+        g.redraw_weaves = True
+        return Rect(0, 0, 0, 0)
+    key = (g.weave_index.generation, len(g.weaves))
+    if not g.pan_wires or g.pan_wires.key != key: # (the view has already moved)
+        wires, owners = weave_wires(g.weaves)
+        g.pan_wires = Rec(key = key, pix = g.view.rtop_many(wires), owners = owners)
+    else:
+        g.pan_wires.pix += (dx, dy)
+    pw = g.pan_wires
+    colors = [ g.palette[g.weave_colors[we]] for we in g.weaves ]
+    #
+    layer.scroll(dx, dy)
+    for strip in ( Rect(0 if dx > 0 else w + dx, 0, abs(dx), h), Rect(0, 0 if dy > 0 else h + dy, w, abs(dy)) ):
+        if not strip: continue
+        layer.set_clip(strip)
+        layer.fill(params.background)
+        draw_wires(layer, pw.pix, pw.owners, colors, antialias = g.antialias, width = g.draw_width)
+    layer.set_clip(None)
+    weave_layer_changed(g)
+    return layer.get_rect()
+
+def update_shape_layer(context):
+    "redraw the cached shapes + nails layer if the shapes, the view or `hide` changed"
+    cx = context
+    key = ( cx.nail_index.generation, tuple(cx.view.corner), cx.view.ppu, 
+            'shapes' in cx.hide, 'nails' in cx.hide, cx.screen.get_size() )
+    if key == cx.shape_layer_key: return False
+    cx.shape_layer_key = key
+    #
+    if cx.shape_layer.get_size() != cx.screen.get_size():
+        cx.shape_layer = Surface(cx.screen.get_size(), SRCALPHA)
+    cx.shape_layer.fill((0, 0, 0, 0))
+    cx.shape_layer.lock()
+    if 'shapes' not in cx.hide:
+        for sh in cx.shapes: sh.draw(cx.shape_layer, cx.view, params.shape_color, draw_divs = False)
+    if 'nails' not in cx.hide:
+        for sh in cx.shapes: sh.draw_divs(cx.shape_layer, cx.view)
+    cx.shape_layer.unlock()
+    return True
+
+def draw_background(context, rect):
+    "redraw what is under the overlays (weaves, grid, shapes) inside `rect`"
+    g = context
+    if 'weaves' not in g.hide: g.screen.blit(g.weave_layer, rect, rect)
+    else: g.screen.fill(params.background, rect)
+    if g.grid_on: g.screen.blit(g.grid_layer, rect, rect)
+    g.screen.blit(g.shape_layer, rect, rect)
+
+def draw_frame(context):
+    '''draw the frame, but only redraw the parts of the screen that changed:
+    the layers where they were updated, and the overlays (selection, hints) and 
+    "widgets" (text, palette, picker) where they were or are now.
+    return the Rects to update on the display'''
+    g = context
+    dirty = []
+    if 'weaves' not in g.hide: 
+        dirty.append(update_weave_layer(g))
+    # note: update may be slightly "too late" if the view has changed this frame
+    #  but this avoids re-doing expensive computations and is probably not perceptible
+    if g.grid_on:
+        g.grid.update(g.view, g.screen.get_size())
+    if update_shape_layer(g): 
+        dirty.append(g.screen.get_rect())
+    gr = g.grid
+    key = ( id(g.screen), g.screen.get_size(), frozenset(g.hide), tuple(g.view.corner), g.view.ppu, 
+            g.grid_on and (tuple(gr.center), gr.phase, gr.rsubdivs, gr.asubdivs, gr.smallest_grad) )
+    if key != g.frame.key:
+        g.frame.key = key
+        dirty.append(g.screen.get_rect())
+        # note: render the grid once, on its own layer (`draw.arc` depends on the clip area)
+        if g.grid_on:
+            if g.grid_layer.get_size() != g.screen.get_size():
+                g.grid_layer = Surface(g.screen.get_size(), SRCALPHA)
+            g.grid_layer.fill((0, 0, 0, 0))
+            g.grid.render(g.grid_layer, params.background, params.grid_color)
+    #
+    # bottom "widgets"
+    bottom_elements = []
+    if g.show_palette: bottom_elements.append(g.palette_widget.render(g.palette, g.color_key))
+    if g.show_menu: g.menu.render(g.text)
+    bottom_elements.append(g.text.render())
+    #
+    widgets = []
+    elt_y = g.screen.get_size()[1]
+    for elt in reversed(bottom_elements):
+        elt_y -= elt.get_size()[1]
+        widgets.append( (elt, (0, elt_y - params.bottom_margin)) )
+    if g.show_picker:
+        widgets.append( (g.color_picker.get_surf(), g.color_picker.corner) )
+    #
+    if widgets != g.frame.widgets:
+        for elt, pos in g.frame.widgets + widgets:
+            dirty.append(Rect(pos, elt.get_size()))
+    dirty.append(g.frame.overlay)
+    #
+    # redraw, overlays are always redrawn on top of a fresh background
+    dirty = [ rect for rect in dirty if rect ]
+    if g.screen.get_rect() in dirty:
+        dirty = [ g.screen.get_rect() ]
+    for rect in dirty:
+        draw_background(g, rect)
+    g.screen.lock()
+    g.frame.overlay = union_rect(
+            *[ sel.draw(g.screen, g.view, color = params.select_color) for sel in g.selected ],
+            *[ hi.draw(g.screen, g.view, color = params.hint_color) for hi in g.hints ])
+    g.screen.unlock()
+    dirty.append(g.frame.overlay)
+    #
+    for elt, pos in widgets:
+        g.screen.blit(elt, pos)
+    g.frame.widgets = widgets
+    return [ rect for rect in dirty if rect ]
+
 def del_context(context):
     if context.autosaver: context.autosaver.finish()
 
@@ -234,69 +404,32 @@ def main():
         post_info("Recovery save found. Try `recover` command", g)
     try:
         while not g.QUIT:
-            if event.get(QUIT):
+            # nothing to redraw and no hook running every frame: sleep until an event comes
+            animated = g.dispatch.watches(LOOP)
+            evs = []
+            if not (g.frame.dirty or animated):
+                g.frame.stats.waits += 1
+                if (ev := event.wait(params.idle_wait)).type != NOEVENT:
+                    evs.append(ev)
+            evs += event.get()
+            if any(ev.type == QUIT for ev in evs):
                 g.QUIT = True
-            evs = event.get()
-            # TODO maybe do several `event.get` calls: 
-            # 1: things we don't care about, 2: MOUSEMOTION, keep only last, 3: send latter + rest to `dispatch`
-            # point: avoid computing `snappy_get_point` (and others) for every intermediate MOUSEMOTION
-            # q?: maybe pygame is smart enough to already only generate 1 MOUSEMOTION (test)
-            g.dispatch.dispatch(evs)
-            g.dispatch.dispatch([event.Event(LOOP)])
-            #
-            # Draw Weaves :
-            if 'weaves' not in g.hide:
-                g.weave_layer.lock()
-                if g.redraw_weaves:
-                    g.weave_layer.fill(params.background)
-                    g.weaves += g.pending_weaves
-                    g.weaves, g.pending_weaves = [], g.weaves
-                    g.redraw_weaves = False
-                for we in g.pending_weaves:
-                    ckey = g.weave_colors[we]
-                    we.draw(
-                            g.weave_layer, g.view, color = g.palette[ckey], 
-                            antialias = g.antialias, width = g.draw_width)
-                    g.weaves.append(we)
-                g.weave_layer.unlock()
-                g.pending_weaves = []
-                g.screen.blit(g.weave_layer, (0, 0))
-            else:
-                g.screen.fill(params.background)
-            #
-            # Draw Rest: (on top)
-            g.screen.lock()
-            # draw grid:
-            # note: update may be slightly "too late" if the view has changed this frame
-            #  but this avoids re-doing expensive computations and is probably not perceptible
-            if g.grid_on:
-                g.grid.update(g.view, g.screen.get_size())
-                g.grid.render(g.screen, params.background, params.grid_color)
-            # draw shapes, etc
-            if 'shapes' not in g.hide:
-                for sh in g.shapes: sh.draw(g.screen, g.view, params.shape_color, draw_divs = False)
-            if 'nails' not in g.hide:
-                for sh in g.shapes: sh.draw_divs(g.screen, g.view)
-            for sel in g.selected: sel.draw(g.screen, g.view, color = params.select_color)
-            for hi in g.hints: hi.draw(g.screen, g.view, color = params.hint_color)
-            g.screen.unlock()
-            #
-            # bottom "widgets"
-            bottom_elements = []
-            if g.show_palette: bottom_elements.append(draw_palette(g.palette, g.color_key))
-            if g.show_menu: g.menu.render(g.text)
-            bottom_elements.append(g.text.render())
-            #
-            elt_y = g.screen.get_size()[1]
-            for elt in reversed(bottom_elements):
-                elt_y -= elt.get_size()[1]
-                g.screen.blit(elt, (0, elt_y - params.bottom_margin))
+            if any(ev.type in (WINDOWEXPOSED, VIDEOEXPOSE) for ev in evs):
+                g.frame.key = None # display content may be lost, redraw everything
+                g.frame.dirty = True
+            # the frame is dirty if a hook handled an event (unless it never redraws, eg autosave),
+            # or something marked it (eg `post_info`)
+            if g.dispatch.dispatch(evs): g.frame.dirty = True
+            if g.dispatch.dispatch([event.Event(LOOP)]): g.frame.dirty = True
             #
-            if g.show_picker:
-                picker_surf = g.color_picker.get_surf()
-                g.screen.blit(picker_surf, g.color_picker.corner)
-            display.flip()
-            clock.tick(60);
+            if g.frame.dirty:
+                start = perf_counter()
+                display.update(draw_frame(g))
+                ms = 1000 * (perf_counter() - start)
+                st = g.frame.stats
+                st.drawn, st.time, st.worst = st.drawn + 1, st.time + ms, max(st.worst, ms)
+                g.frame.dirty = False
+                clock.tick(params.fps);
     except:
         save(save_path(params.recover_filename), g, overwrite_ok = True)
         eprint('Unexpected Fatal Error. Recovery save succesful')
@@ -1,9 +1,12 @@
-import os
+import os, re, gc, threading, queue, mmap
+from contextlib import contextmanager
+from itertools import chain
+import numpy as np
 from pygame import Color
 
 from .params import params
 from .shape import *
-from .util import naive_scan, Rec, sprint, clamp
+from .util import naive_scan, Rec, sprint, eprint, clamp
 from .merge import merge_weaves
 
 class SaveError(BaseException): pass
@@ -16,15 +19,35 @@ def save_path(file):
     os.makedirs(os.path.dirname(prefixed), exist_ok = True)
     return prefixed
 
+def _merge_weaves(context):
+    # (merge duplicates before saving)
+    nweaves = len(context.weaves) + len(context.pending_weaves)
+    context.weaves = merge_weaves(context.weaves + context.pending_weaves)
+    if hasattr(context, 'weave_index') and len(context.weaves) != nweaves: 
+        context.weave_index.reset(context.weaves) # drop merged duplicates
+
+def _extra_lines(context, extra):
+    lines = []
+    for k in extra:
+        line = f"{k}="
+        try:
+            match k: # only supported k = session for now
+                case 'session':
+                    line += os.path.basename(context.autosaver.root)
+            lines.append(line)
+        except: pass # just ignore problematic lines
+    return lines
+
 def save_buffer(context, extra = set()): 
+    shape_ids = { sh: i for (i, sh) in enumerate(context.shapes) }
     def weave_data_line(we, ckey):
-        shape_id1 = context.shapes.index(we.hangpoints[0].s)
-        shape_id2 = context.shapes.index(we.hangpoints[1].s)
+        shape_id1 = shape_ids[we.hangpoints[0].s]
+        shape_id2 = shape_ids[we.hangpoints[1].s]
         line = f"{we.nwires} {we.incrs[0]} {we.incrs[1]} {ckey} "
         line += f"{shape_id1} {we.hangpoints[0].i} {shape_id2} {we.hangpoints[1].i}" 
         return line
     #
-    context.weaves = merge_weaves(context.weaves + context.pending_weaves)
+    _merge_weaves(context)
     lines = []
     def p(*a, **ka):
         lines.append(sprint(*a, **ka))
@@ -43,14 +66,7 @@ def save_buffer(context, extra = set()):
     #
     if extra:
         p("EXTRADATA")
-        for k in extra:
-            line = f"{k}="
-            try:
-                match k: # only supported k = session for now
-                    case 'session':
-                        line += os.path.basename(context.autosaver.root)
-                p(line)
-            except: pass # just ignore problematic lines
+        for line in _extra_lines(context, extra): p(line)
     #
     return ''.join(lines)
 
@@ -60,22 +76,66 @@ _save_header = ''.join([
     "# color format: key r g b\n",
 ])
 def write_save(filename, buffer, overwrite_ok = True, header = False):
-    open_mode = 'w' if overwrite_ok else 'x'
+    # `buffer`: str (text format) or bytes (binary format, no header)
+    binary = isinstance(buffer, bytes)
+    open_mode = ('w' if overwrite_ok else 'x') + ('b' if binary else '')
     try:
         filename = os.path.join('.', filename)
         os.makedirs(os.path.dirname(filename), exist_ok = True)
         with open(filename, open_mode) as f:
-            buffer = _save_header + buffer if header else buffer
+            buffer = _save_header + buffer if (header and not binary) else buffer
             f.write(buffer)
     except (FileExistsError, OSError): raise
     except:
         os.remove(filename)
         raise
 
-def save(filename, context, overwrite_ok = True, header = True, extra = {'session'}):
-    buffer = save_buffer(context, extra)
+def save(filename, context, overwrite_ok = True, header = True, extra = {'session'}, buffer = None):
+    # `buffer`: the text buffer, if already computed
+    # the format is chosen by `params.binary_saves` (`load` detects it)
+    if params.binary_saves: buffer = binary_save_buffer(context, extra)
+    elif buffer is None: buffer = save_buffer(context, extra)
     write_save(filename, buffer, overwrite_ok, header)
 
+###### BINARY FORMAT ######
+# header, shape table, keypoints (packed float64), palette, weave table, extra ("k=v" lines, utf-8)
+# all little-endian, each section starts on a multiple of 8 bytes.
+# loading is a few `np.frombuffer` over a `mmap` of the file: no per-line parsing
+_binary_magic = b'QWBIN\x00\x00\x01' # last byte: version
+_bin_header = np.dtype([('magic', 'S8'), ('nshapes', '<u4'), ('nkeypoints', '<u4'), 
+    ('ncolors', '<u4'), ('nweaves', '<u4'), ('nextra', '<u4'), ('pad', '<u4')])
+_bin_shape = np.dtype([('type', 'u1'), ('nkeys', '<u4'), ('ndivs', '<u4')])
+_bin_color = np.dtype([('key', '<i4'), ('rgb', 'u1', 3)]) # key: code point
+_bin_weave = np.dtype([ (name, '<i4') for name in ('n', 'inc1', 'inc2', 'ckey', 'id1', 'i1', 'id2', 'i2') ])
+_bin_type_codes = ('cr', 'ccr', 'ln', 'ls', 'po', 'p', 'ar', 'car') # never reorder (only append)
+
+def binary_save_buffer(context, extra = set()):
+    "same content as `save_buffer`, as bytes in the binary format"
+    shape_ids = { sh: i for (i, sh) in enumerate(context.shapes) }
+    _merge_weaves(context)
+    #
+    codes = { pre: i for i, pre in enumerate(_bin_type_codes) }
+    shapes = np.zeros(len(context.shapes), _bin_shape)
+    shapes['type'] = [ codes[subshape_to_prefix(sh)] for sh in context.shapes ]
+    shapes['nkeys'] = [ len(sh.keypoints) for sh in context.shapes ]
+    shapes['ndivs'] = [ len(sh.divs) for sh in context.shapes ]
+    keypoints = np.concatenate([ sh.keypoints for sh in context.shapes ] or [np.zeros((0, 2))])
+    colors = np.array([ (ord(k), (c.r, c.g, c.b)) for k, c in context.palette.items() ], _bin_color)
+    weaves = np.array([ (we.nwires, *we.incrs, ord(context.weave_colors[we]),
+                         shape_ids[we.hangpoints[0].s], we.hangpoints[0].i, 
+                         shape_ids[we.hangpoints[1].s], we.hangpoints[1].i) 
+                        for we in context.weaves ], _bin_weave)
+    extra = ''.join([ line + '\n' for line in _extra_lines(context, extra) ]).encode()
+    header = np.array([ (_binary_magic, len(shapes), len(keypoints), 
+                         len(colors), len(weaves), len(extra), 0) ], _bin_header)
+    #
+    out = bytearray()
+    for section in (header, shapes, keypoints.astype('<f8'), colors, weaves):
+        out += section.tobytes()
+        out += bytes(-len(out) % 8)
+    out += extra
+    return bytes(out)
+
 class LoadError(BaseException): pass
 class ParseError(BaseException):
     def __init__(self, i, line, section = None):
@@ -91,7 +151,160 @@ class ParseError(BaseException):
         return fstr
     ###
 
+def _loaded_subcontext(shapes, weaves, weave_colors, palette):
+    return Rec(
+            shapes = shapes, 
+            weaves = weaves,
+            pending_weaves = [], # needed for `save_buffer`
+            weave_colors = weave_colors,
+            palette = palette)
+
+def _group_rows(rows):
+    "return the distinct rows of the 2d int array `rows`, and for each the indices where it occurs"
+    if len(rows) == 0: return [], []
+    uniq, inverse = np.unique(rows, axis = 0, return_inverse = True)
+    order = np.argsort(inverse.ravel(), kind = 'stable')
+    return uniq.tolist(), np.split(order, np.cumsum(np.bincount(inverse.ravel()))[:-1])
+
+def _build_shapes(groups, nshapes):
+    '''`groups`: [(prefix, ndivs, positions, keypoints), ...], keypoints: (len(positions), k, 2)
+    return the `nshapes` shapes, each at its position. (each group is built at once)'''
+    shapes = [None] * nshapes
+    for prefix, ndivs, positions, keypoints in groups:
+        for pos, sh in zip(positions.tolist(), shapes_from_keypoints(prefix, keypoints, ndivs)):
+            shapes[pos] = sh
+    return shapes
+
+def _build_weaves(rows, ckeys, shapes):
+    '''`rows`: (m, 7) int array, rows (n, inc1, inc2, shape_id1, i1, shape_id2, i2), `shapes`: shape_id -> shape
+    return weaves, weave_colors'''
+    rows = np.asarray(rows, dtype = int).reshape(-1, 7)
+    shapes1, shapes2 = ( list(map(shapes.__getitem__, rows[:, k].tolist())) for k in (3, 5) )
+    weaves = weaves_from_table(rows[:, [0, 1, 2, 4, 6]], shapes1, shapes2)
+    return weaves, dict(zip(weaves, ckeys))
+
+@contextmanager
+def _gc_paused():
+    '''loads create lots of small objects at once: the cyclic gc would keep running for nothing meanwhile
+    they live as long as the design, so they are then moved out of the collected generations (`gc.freeze`)
+    (the weaves and hangpoints hold no cycles: refcounting still frees them when the design is dropped)'''
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try: yield
+    finally:
+        gc.freeze()
+        if was_enabled: gc.enable()
+
 def load(filename):
+    "load a save, in either format"
+    try:
+        with open(filename, 'rb') as f:
+            binary = (f.read(len(_binary_magic)) == _binary_magic)
+    except: raise LoadError()
+    with _gc_paused():
+        return load_binary(filename) if binary else load_text(filename)
+
+def load_binary(filename):
+    try:
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as m:
+            offset = 0
+            def section(dtype, count):
+                # copy: no view may outlive the mmap
+                nonlocal offset
+                arr = np.frombuffer(m, dtype, int(count), offset).copy()
+                offset += arr.nbytes + (-arr.nbytes % 8)
+                return arr
+            #
+            [header] = section(_bin_header, 1)
+            if header['magic'] != _binary_magic: raise LoadError()
+            shape_table = section(_bin_shape, header['nshapes'])
+            keypoints = section('<f8', 2 * header['nkeypoints']).reshape(-1, 2)
+            color_table = section(_bin_color, header['ncolors'])
+            weave_table = section(_bin_weave, header['nweaves'])
+            extra_lines = m[offset:offset + header['nextra']].decode().splitlines()
+        #
+        starts = np.cumsum(shape_table['nkeys'], dtype = int) - shape_table['nkeys']
+        kinds = np.stack([shape_table['type'], shape_table['nkeys'], shape_table['ndivs']], 1).astype(int)
+        groups = [ (_bin_type_codes[code], ndivs, where, keypoints[starts[where, None] + np.arange(k)])
+                   for (code, k, ndivs), where in zip(*_group_rows(kinds)) ]
+        shapes = _build_shapes(groups, len(shape_table))
+        #
+        palette = { chr(k): Color(*rgb) for k, rgb in zip(color_table['key'].tolist(), color_table['rgb'].tolist()) }
+        rows = np.stack([ weave_table[k] for k in ('n', 'inc1', 'inc2', 'id1', 'i1', 'id2', 'i2') ], 1)
+        weaves, colors = _build_weaves(rows, map(chr, weave_table['ckey'].tolist()), shapes)
+        extra = dict(line.split('=') for line in extra_lines)
+        #
+        return _loaded_subcontext(shapes, weaves, colors, palette), extra
+    except: raise LoadError()
+
+def load_text(filename):
+    # fast path first. it doesn't say where errors are: in that case reparse line by line
+    try: return _load_text_bulk(filename)
+    except: return _load_text_lines(filename)
+
+def _parse_color_line(line, palette):
+    key, r, g, b = naive_scan(line, None, int, int, int)
+    if len(key) != 1: raise Exception()
+    palette[key] = Color(r, g, b)
+
+def _parse_extra_line(line, extra):
+    [k, v] = line.strip().split('=')
+    extra[k] = v
+
+_header_end_re = re.compile(r'DATA$', re.M) # headers: any line ending with DATA, like `_load_text_lines`
+_comment_re = re.compile(r'^[^\S\n]*#.*$', re.M)
+_blank_re = re.compile(r'^[^\S\n]*$', re.M)
+
+def _load_text_bulk(filename):
+    '''same as `_load_text_lines`, but the file is cut into sections with regexes, 
+    the SHAPEDATA and WEAVEDATA sections are parsed in bulk with numpy,
+    and shapes of the same kind are built together (see `shapes_from_keypoints`)'''
+    with open(filename, 'r') as f:
+        text = f.read()
+    if '#' in text: text = _comment_re.sub('', text)
+    ends = [ m.end() for m in _header_end_re.finditer(text) ]
+    starts = [ text.rfind('\n', 0, end) + 1 for end in ends ]
+    if text[:starts[0] if starts else len(text)].strip(): raise Exception() # data before any section header
+    sections = {} # (a section may come back several times: concatenate, like `_load_text_lines`)
+    for start, end, next_start in zip(starts, ends, starts[1:] + [len(text)]):
+        sections[text[start:end]] = sections.get(text[start:end], '') + text[end:next_start]
+    if not sections.keys() <= {'SHAPEDATA', 'COLORDATA', 'WEAVEDATA', 'EXTRADATA'}: raise Exception()
+    def lines(head): # (without the empty ones)
+        return [ line for line in sections.get(head, '').splitlines() if line.strip() ]
+    #
+    # shapes: "id: type ndivs x1 y1 ...", grouped by (type, ndivs, number of tokens)
+    by_kind = {}
+    for pos, line in enumerate(lines('SHAPEDATA')):
+        [shape_id, data] = line.split(':')
+        [typre, ndivs, *xys] = data.split()
+        by_kind.setdefault((typre, int(ndivs), len(xys)), []).append((pos, shape_id, xys))
+    ids, groups = {}, []
+    for (typre, ndivs, ncoords), group in by_kind.items():
+        positions, shape_ids, xys = zip(*group)
+        ids.update(zip(positions, shape_ids))
+        coords = np.fromstring(' '.join(chain.from_iterable(xys)), dtype = float, sep = ' ')
+        if len(coords) != len(group) * ncoords: raise Exception()
+        groups.append((typre, ndivs, np.array(positions), coords.reshape(len(group), -1, 2)))
+    shapes = _build_shapes(groups, len(ids))
+    sh_dict = { int(ids[pos]): sh for (pos, sh) in enumerate(shapes) }
+    #
+    palette, extra = {}, {}
+    for line in lines('COLORDATA'): _parse_color_line(line, palette)
+    for line in lines('EXTRADATA'): _parse_extra_line(line, extra)
+    #
+    # weaves: "n inc1 inc2 color_key shape_id1 i1 shape_id2 i2"
+    weave_text = sections.get('WEAVEDATA', '')
+    nweaves = weave_text.count('\n') + 1 - len(_blank_re.findall(weave_text)) # (non empty lines)
+    tokens = weave_text.split()
+    if len(tokens) != 8 * nweaves: raise Exception()
+    ckeys = tokens[3::8]
+    del tokens[3::8]
+    table = np.fromstring(' '.join(tokens), dtype = int, sep = ' ')
+    if len(table) != 7 * nweaves: raise Exception()
+    weaves, colors = _build_weaves(table, ckeys, sh_dict)
+    return _loaded_subcontext(list(sh_dict.values()), weaves, colors, palette), extra
+
+def _load_text_lines(filename):
     try:
         with open(filename, 'r') as f:
             section = None
@@ -112,14 +325,11 @@ def load(filename):
                             shape_id = int(shape_id)
                             sh_dict[shape_id] = create_shape_from_repr(data)
                         case 'COLORDATA':
-                            key, r, g, b = naive_scan(line, None, int, int, int)
-                            if len(key) != 1: raise Exception()
-                            palette[key] = Color(r, g, b)
+                            _parse_color_line(line, palette)
                         case 'WEAVEDATA':
                             weave_lines.append(line)
                         case 'EXTRADATA':
-                            [k, v] = line.strip().split('=')
-                            extra[k] = v
+                            _parse_extra_line(line, extra)
                         case _: raise Exception()
                 except: 
                     raise ParseError(i + 1, line, section)
@@ -136,20 +346,17 @@ def load(filename):
                 except:
                     raise ParseError(i + 1, line, 'WEAVEDATA')
             ###
-            loaded_subcontext = Rec(
-                    shapes = list(sh_dict.values()), 
-                    weaves = weaves,
-                    pending_weaves = [], # needed for `save_buffer`
-                    weave_colors = colors,
-                    palette = palette)
-            return loaded_subcontext, extra
+            return _loaded_subcontext(list(sh_dict.values()), weaves, colors, palette), extra
     except ParseError: raise
     except: raise LoadError()
 
 class Autosaver: # autosaves system
+    # the UI thread only serializes the design (`save_buffer`),
+    # writing + rotating the archive is done by a writer thread fed through a bounded queue.
+    # `rotor` and `nsaves` belong to the writer: `flush` before reading them
     class DirectoryBusyError(BaseException): pass
     #
-    def __init__(self, root, pulse = 10):
+    def __init__(self, root, pulse = 10, backlog = 4):
         try: 
             os.makedirs(root, exist_ok = True)
             with open(os.path.join(root, '.busy'), 'x'): pass # touch .busy
@@ -158,6 +365,7 @@ class Autosaver: # autosaves system
         #
         self.last_load = 0
         self.back, self.last_buffer = 0, ''
+        self.last_generation = None
         self.root = root
         #
         self.pulse = pulse
@@ -177,45 +385,71 @@ class Autosaver: # autosaves system
                 dir = os.path.join(dir, 'older')
         except FileNotFoundError:
             pass
+        #
+        self.pending = queue.Queue(maxsize = backlog) # `put` blocks when the writer is that far behind
+        self.writer = threading.Thread(target = self._write_loop, daemon = True)
+        self.writer.start()
+    #
+    def _write_loop(self):
+        while True:
+            buffer = self.pending.get()
+            try:
+                if buffer is None: return
+                savename = os.path.join(self.root, 'tmp')
+                write_save(savename, buffer)
+                self._archive(0, self.root, savename)
+            except Exception as e:
+                eprint(f"autosave failed: {e}")
+            finally:
+                self.pending.task_done()
+    #
+    def flush(self):
+        "wait until every queued save is on disk"
+        self.pending.join()
     #
     def finish(self):
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
         with open(os.path.join(self.root, '.rotor'), 'w') as rotor:
             rotor.write(' '.join([str(i) for i in self.rotor]) + '\n')
         #
         try: os.remove(os.path.join(self.root, '.busy'))
         except: pass
     #
-    def savepoint(self, context):
+    def _archive(self, k, destdir, src):
         # k = directory nesting depth
-        def archive(k, destdir, src):
-            if not (k < len(self.rotorctl)): return
-            if not (k < len(self.rotor)):
-                self.rotor.append(0)
-            #
-            isave = self.rotor[k]
-            try: n, d = self.rotorctl[k]
-            except: n, d = self.rotorctl[k], None
-            #
-            dest = os.path.join(destdir, str(isave))
-            if not os.path.isfile(dest):
-                self.nsaves += 1
-            elif d and isave % d == 0:
-                archive(k + 1, os.path.join(destdir, 'older'), dest)
-            os.makedirs(destdir, exist_ok = True)
-            if os.path.isfile(dest): os.remove(dest)
-            os.rename(src, dest)
-            self.rotor[k] = (isave + 1) % n
-        ###
-        buffer = save_buffer(context)
+        if not (k < len(self.rotorctl)): return
+        if not (k < len(self.rotor)):
+            self.rotor.append(0)
+        #
+        isave = self.rotor[k]
+        try: n, d = self.rotorctl[k]
+        except: n, d = self.rotorctl[k], None
+        #
+        dest = os.path.join(destdir, str(isave))
+        if not os.path.isfile(dest):
+            self.nsaves += 1
+        elif d and isave % d == 0:
+            self._archive(k + 1, os.path.join(destdir, 'older'), dest)
+        os.makedirs(destdir, exist_ok = True)
+        os.replace(src, dest)
+        self.rotor[k] = (isave + 1) % n
+    #
+    def savepoint(self, context, generation = None):
+        # `generation`: if given and unchanged since last call, nothing changed: skip serializing
+        if generation is not None and generation == self.last_generation:
+            return
+        self.last_generation = generation
+        buffer = save_buffer(context) # snapshot (immutable str), safe to hand over to the writer
         if self.last_buffer == buffer:
             return
         self.last_buffer = buffer
-        savename = os.path.join(self.root, 'tmp')
-        write_save(savename, buffer)
-        archive(0, self.root, savename)
+        self.pending.put(buffer)
         self.back = 0
     #
     def rewind(self, n = 1):
+        self.flush()
         if self.nsaves == 0: return
         self.back = clamp(self.back + n, 0, self.nsaves - 1) # number *back* in time
     #
@@ -223,6 +457,7 @@ class Autosaver: # autosaves system
         self.rewind(-n)
     #
     def current_file(self):
+        self.flush()
         if self.nsaves == 0: return
         #
         back, reldir = self.back, ''
@@ -6,13 +6,35 @@ from math import atan2
 
 from .params import params
 from .util import Rec
+from .view import AffineView
 from .math_utils import *
 
 def draw_point(screen, point, color = params.div_color, rad = params.point_radius):
-    draw.circle(screen, color, point, rad)
+    return draw.circle(screen, color, point, rad)
+
+def union_rect(*rects):
+    "bounding Rect of the non-empty `rects` (draw functions return the Rect they touched)"
+    rects = [r for r in rects if r]
+    if not rects: return Rect(0, 0, 0, 0)
+    return rects[0].unionall(rects[1:])
+
+def _keypoint_property(i):
+    def get(self): return self.keypoints[i]
+    def set(self, val): self.keypoints[i] = ar(val)
+    return property(get, set)
 
 class Shape:
+    # slots: shapes are numerous (tens of thousands in big designs), small, and copied a lot
+    __slots__ = ('keypoints', 'divs', 'loopy')
     _KEYPOINT_NAMES = ()
+    _FLAGS = ('loopy',) # non-array attributes (copied as is)
+    #
+    def __init_subclass__(cls, **ka):
+        # `_KEYPOINT_NAMES` become properties (eg `circle.center` is `circle.keypoints[0]`)
+        super().__init_subclass__(**ka)
+        for i, name in enumerate(cls.__dict__.get('_KEYPOINT_NAMES', ())):
+            setattr(cls, name, _keypoint_property(i))
+        cls._FLAGS = cls._FLAGS + tuple(cls.__dict__.get('__slots__', ()))
     #
     def set_divs(self, ndivs):
         raise NotImplementedError()
@@ -21,21 +43,11 @@ class Shape:
         self.keypoints = np.array([ar(p) for p in keypoints])
         self.set_divs(ndivs)
     #
-    def __setattr__(self, key, val):
-        try:
-            i = type(self)._KEYPOINT_NAMES.index(key)
-            self.keypoints[i] = ar(val)
-        except ValueError:
-            self.__dict__[key] = val
-    #
-    def __getattr__(self, key):
-        try:
-            i = type(self)._KEYPOINT_NAMES.index(key)
-            return self.keypoints[i]
-        except ValueError:
-            try:
-                return self.__dict__[key]
-            except KeyError: raise AttributeError(key)
+    def __deepcopy__(self, memo):
+        new = type(self).__new__(type(self))
+        new.keypoints, new.divs = self.keypoints.copy(), self.divs.copy()
+        for name in self._FLAGS: setattr(new, name, getattr(self, name))
+        return new
     #
     def __repr__(self):
         typre = subshape_to_prefix(self)
@@ -45,13 +57,17 @@ class Shape:
         return repre
     #
     def draw_divs(self, screen, view, color = params.div_color):
-        for div in self.divs:
-            draw_point(screen, view.rtop(div), color)
+        (w, h), m = screen.get_size(), params.point_radius
+        pdivs = view.rtop_many(self.divs)
+        visible = ((-m <= pdivs) & (pdivs < (w + m, h + m))).all(1)
+        return union_rect(*[ draw_point(screen, pdiv, color) for pdiv in pdivs[visible].tolist() ])
     #
     def draw(self, screen, view, color, draw_divs = True):
         # call at end of child method
+        # all `draw` methods return the Rect they touched
         if draw_divs:
-            self.draw_divs(screen, view)
+            return self.draw_divs(screen, view)
+        return Rect(0, 0, 0, 0)
     #
     def get_div(self, i):
         if self.loopy:
@@ -70,18 +86,11 @@ class Shape:
         return deepcopy(self).move(motion)
     #
     def transform(self, matrix, center):
-        def aux(points):
-            points -= center
-            points = points.transpose()
-            points = (matrix @ points).transpose()
-            points += center 
-            return points
-        self.keypoints = aux(self.keypoints)
-        self.set_divs( len(self.divs) )
+        transform_shapes([self], matrix, center, copy = False)
         return self
     #
     def transformed(self, matrix, center):
-        return deepcopy(self).transform(matrix, center)
+        return transform_shapes([self], matrix, center)[0]
     #
     def merger(self, to):
         '''if `self` and `to` intuitively "overlap", 
@@ -90,6 +99,14 @@ class Shape:
         '''
         return None
     #
+    def merge_key(self):
+        "shapes that `merger` may accept share this key"
+        return (type(self), len(self.divs))
+    #
+    def merge_anchor(self):
+        "point that shapes `merger` may accept share (up to eps). (used to index merge candidates)"
+        return self.keypoints.mean(0) # same if keypoints are reversed
+    #
     def _naive_merger(self, to):
         if ( type(to) != type(self) ) or ( len(self.divs) != len(to.divs) ):
             return None
@@ -109,6 +126,7 @@ def bounding_rect(shape0, *shapes):
     return vmin, vmax
 
 class Circle(Shape):
+    __slots__ = ('clockwise',)
     _KEYPOINT_NAMES = ('center', 'other')
     def __init__(self, center, other, ndivs = 120, clockwise = False):
         self.loopy = True
@@ -131,14 +149,11 @@ class Circle(Shape):
     def draw(self, screen, view, color = params.shape_color, draw_divs = True):
         pcenter = view.rtop(self.center)
         pradius = view.rtopd(dist(self.center, self.other))
-        draw.circle(screen, color, pcenter, pradius, width = 1)
-        super().draw(screen, view, color, draw_divs)
+        rect = draw.circle(screen, color, pcenter, pradius, width = 1)
+        return union_rect(rect, super().draw(screen, view, color, draw_divs))
     #
-    def transform(self, matrix, center):
-        [[a, b], [c, d]] = matrix
-        det = a * d - b * c
-        if det < 0: self.clockwise = not self.clockwise
-        return Shape.transform(self, matrix, center)
+    def merge_anchor(self):
+        return self.center # `other` can be anywhere on the circle
     #
     def merger(self, to):
         n = len( self.divs)
@@ -167,6 +182,7 @@ class Circle(Shape):
     ###
 
 class Arc(Shape):
+    __slots__ = ('clockwise',)
     _KEYPOINT_NAMES = ('center', 'start', 'end')
     def __init__(self, center, start, end, ndivs = 30, clockwise = False):
         center, start, end = (ar(p) for p in (center, start, end))
@@ -200,8 +216,7 @@ class Arc(Shape):
     #
     def draw(self, screen, view, color = params.shape_color, draw_divs = True):
         if almost_equal(self.center, self.start):
-            Shape.draw_divs(self, screen, view)
-            return
+            return Shape.draw_divs(self, screen, view)
         #
         rr = dist(self.center, self.start)
         centerp, rp = view.rtop(self.center), view.rtopd(rr)
@@ -209,20 +224,13 @@ class Arc(Shape):
         bound = Rect(left, top, 2 * rp, 2 * rp)
         #
         t1, t2 = (atan2(p[1], p[0])
-                  for p in (self.start - self.center, self.end - self.center))
+                  for p in (view.rvec(self.start - self.center), view.rvec(self.end - self.center)))
         t1, t2 = t1, t1 + ((t2 - t1) % (2*np.pi))
-        if self.clockwise:
+        if self.clockwise != view.mirrors:
             t1, t2 = t2, t1
         #
-        draw.arc(screen, color, bound, t1, t2)
-        super().draw(screen, view, color, draw_divs)
-    #
-    def transform(self, matrix, center):
-        [[a, b], [c, d]] = matrix
-        det = a * d - b * c
-        if det < 0: 
-            self.clockwise = not self.clockwise
-        return Shape.transform(self, matrix, center)
+        rect = draw.arc(screen, color, bound, t1, t2)
+        return union_rect(rect, super().draw(screen, view, color, draw_divs))
     #
     def merger(self, to):
         if ( type(to) != Arc ) or ( len(self.divs) != len(to.divs) ):
@@ -235,7 +243,8 @@ class Arc(Shape):
     #
 
 class Point(Shape):
-    _KEYPOINT_NAMES = ('p')
+    __slots__ = ()
+    _KEYPOINT_NAMES = ('p',)
     def __init__(self, p, ndivs = 1): # `ndivs` is a dummy
         self.loopy = True
         Shape.__init__(self, p, ndivs = 1)
@@ -245,7 +254,7 @@ class Point(Shape):
     #
     def draw(self, screen, view, color = params.shape_color, draw_divs = True):
         # draw_divs ignored
-        draw_point(screen, view.rtop(self.p), color, rad = params.point_shape_radius)
+        return draw_point(screen, view.rtop(self.p), color, rad = params.point_shape_radius)
     #
     def merger(self, to):
         if (type(to) != Point):
@@ -256,6 +265,7 @@ class Point(Shape):
     ###
 
 class Line(Shape):
+    __slots__ = ()
     _KEYPOINT_NAMES = ('start', 'end')
     def __init__(self, start, end, ndivs = 30):
         self.loopy = False
@@ -266,54 +276,27 @@ class Line(Shape):
     #
     def draw(self, screen, view, color = params.shape_color, draw_divs = True):
         pstart, pend = view.rtop(self.start), view.rtop(self.end)
-        draw.line(screen, color, pstart, pend)
-        super().draw(screen, view, color, draw_divs)
+        rect = draw.line(screen, color, pstart, pend)
+        return union_rect(rect, super().draw(screen, view, color, draw_divs))
     #
     def merger(self, to):
         return self._naive_merger(to)
     ###
 
 class PolyLine(Shape):
+    __slots__ = ()
     def __init__(self, point1, point2, *points, ndivs = 120, loopy = False):
         self.loopy = loopy
         Shape.__init__(self, point1, point2, *points, ndivs = ndivs)
     #
     def set_divs(self, ndivs):
-        if ndivs == 1: 
-            self.divs = np.array([self.keypoints[0]])
-            return
-        #
-        keypoints = [*self.keypoints] + ([self.keypoints[0]] if self.loopy else [])
-        kp_dists = [0]
-        for i in range(len(keypoints) - 1):
-            [a, b] = keypoints[i:i+2]
-            kp_dists.append( kp_dists[-1] + dist(a, b) )
-        #
-        if near_zero(kp_dists[-1]):
-            self.divs = np.array([keypoints[0]])
-            return
-        #
-        k, D = 0, kp_dists[-1]
-        ts = np.linspace(0, D, ndivs, endpoint = not self.loopy)
-        divs = []
-        for t in ts:
-            while k + 1 < len(keypoints) and t > kp_dists[k + 1]: 
-                k += 1
-            segment_len = (kp_dists[k+1] - kp_dists[k])
-            if near_zero(segment_len):
-                t = kp_dists[k]
-            else:
-                t = (t - kp_dists[k]) / segment_len
-            divs.append( (1. - t) * keypoints[k] + t * keypoints[k+1] )
-        self.divs = np.array(divs)
+        set_divs_many([self], ndivs)
     #
     def draw(self, screen, view, color = params.shape_color, draw_divs = True):
         if len(self.keypoints) == 1:
-            draw_point(screen, self.keypoints[0], color)
-            return
-        ppoints = [view.rtop(rp) for rp in self.keypoints]
-        draw.lines(screen, color, self.loopy, ppoints)
-        super().draw(screen, view, color, draw_divs)
+            return draw_point(screen, self.keypoints[0], color)
+        rect = draw.lines(screen, color, self.loopy, view.rtop_many(self.keypoints).tolist())
+        return union_rect(rect, super().draw(screen, view, color, draw_divs))
     # 
     def merger(self, to):
         # Doesn't handle rotations of keypoints
@@ -324,6 +307,86 @@ class PolyLine(Shape):
         return self._naive_merger(to)
     ###
 
+def set_divs_many(shapes, ndivs):
+    '''same as `sh.set_divs(ndivs)` for all `shapes`, 
+    but all the polylines are divided at once (arc-length parametrization on the concatenated segments)'''
+    polys = []
+    for sh in shapes:
+        if type(sh) is not PolyLine: sh.set_divs(ndivs)
+        elif ndivs == 1 or len(sh.keypoints) == 1: sh.divs = sh.keypoints[:1].copy()
+        else: polys.append(sh)
+    if not polys: return
+    # segments of all the polylines, end to end (+ closing segment if loopy)
+    starts = np.concatenate([ sh.keypoints for sh in polys ])
+    ends = np.concatenate([ np.roll(sh.keypoints, -1, 0) for sh in polys ])
+    nsegs = np.array([ len(sh.keypoints) - (not sh.loopy) for sh in polys ])
+    keep = np.concatenate([ [True] * (len(sh.keypoints) - 1) + [sh.loopy] for sh in polys ])
+    starts, ends = starts[keep], ends[keep]
+    lens = np.linalg.norm(ends - starts, axis = 1)
+    cum = np.cumsum(lens)
+    first = np.cumsum(nsegs) - nsegs # first segment of each polyline
+    last = first + nsegs - 1
+    origin = cum[first] - lens[first] # arc-length at the start of each polyline
+    total = cum[last] - origin
+    # parameter (arc-length) of each nail
+    loopy = np.array([ sh.loopy for sh in polys ])
+    steps = total / np.where(loopy, ndivs, ndivs - 1)
+    ts = origin[:, None] + steps[:, None] * np.arange(ndivs)
+    ks = np.searchsorted(cum, ts, 'left').clip(first[:, None], last[:, None])
+    seg_lens = lens[ks]
+    fracs = np.where(seg_lens < params.eps, 0, (ts - (cum[ks] - seg_lens)) / np.maximum(seg_lens, params.eps))
+    fracs = fracs.clip(0, 1)[..., None]
+    divs = (1. - fracs) * starts[ks] + fracs * ends[ks]
+    for sh, sh_divs, length in zip(polys, divs, total.tolist()):
+        sh.divs = sh.keypoints[:1].copy() if near_zero(length) else sh_divs
+
+def transform_shapes(shapes, matrix, center, copy = True):
+    '''apply the affine map `p -> matrix @ (p - center) + center` to all `shapes` at once
+    return the transformed copies (or transform in place if not `copy`)
+    similarities (rotations, flips, uniform scales) map nails to nails, 
+    so the divs are transformed along with the keypoints (in the same matmul), instead of recomputed'''
+    if copy: shapes = [ deepcopy(sh) for sh in shapes ]
+    if not shapes: return shapes
+    matrix, center = ar(matrix), ar(center)
+    [[a, b], [c, d]] = matrix
+    det = a * d - b * c
+    # similarity <=> columns orthogonal and of the same norm
+    similar = near_zero(a * b + c * d) and near_zero((a * a + c * c) - (b * b + d * d))
+    #
+    arrays = [ sh.keypoints for sh in shapes ] + ([ sh.divs for sh in shapes ] if similar else [])
+    points = np.concatenate(arrays)
+    points = (points - center) @ matrix.T + center
+    for arr, new in zip(arrays, np.split(points, np.cumsum([ len(arr) for arr in arrays ])[:-1])):
+        arr[...] = new # in place: keeps `divs` that are views into a `ShapeStore` buffer valid
+    #
+    if det < 0:
+        for sh in shapes:
+            if 'clockwise' in sh._FLAGS: sh.clockwise = not sh.clockwise
+    if not similar:
+        by_ndivs = {}
+        for sh in shapes: by_ndivs.setdefault(len(sh.divs), []).append(sh)
+        for ndivs, group in by_ndivs.items(): set_divs_many(group, ndivs)
+    return shapes
+
+class TransformedHint:
+    '''`shapes` as if transformed by `transform_shapes(shapes, matrix, center)`, then moved by `offset`
+    the transformation is only applied when drawing (through an `AffineView`): nothing is copied.
+    for previews (`matrix` must be a similarity, or None for a simple move)'''
+    def __init__(self, shapes, matrix = None, center = (0, 0), offset = (0, 0)):
+        self.shapes, self.matrix, self.center, self.offset = shapes, matrix, center, offset
+    #
+    def draw(self, screen, view, color = params.shape_color, draw_divs = True):
+        aview = AffineView(view, self.matrix, self.center, self.offset)
+        return union_rect(*[ sh.draw(screen, aview, color, draw_divs) for sh in self.shapes ])
+    #
+    def apply(self, copy = True):
+        "actually transform the shapes (or copies of them). return the transformed shapes"
+        if self.matrix is None: shapes = [ deepcopy(sh) for sh in self.shapes ] if copy else self.shapes
+        else: shapes = transform_shapes(self.shapes, self.matrix, self.center, copy)
+        for sh in shapes: sh.move(ar(self.offset))
+        return shapes
+    ###
+
 ###### SHAPE SERIALIZATION ###########
 
 _prefix_to_initializer = { 
@@ -345,16 +408,10 @@ for pre, (ty, ka) in _prefix_to_initializer.items():
     _subtype_to_prefix_candidates[ ty ].append( (pre, ka) )
 #
 
-def is_subdict(sub, sup, values_must_match = True):
-    for k, v in sub.items():
-        if not k in sup: return False
-        if values_must_match and sup[k] != v: return False
-    return True
-
 def subshape_to_prefix(subshape):
     candidates = _subtype_to_prefix_candidates[ type(subshape) ]
     for pre, ka in candidates:
-        if is_subdict(ka, subshape.__dict__):
+        if all( getattr(subshape, k) == v for k, v in ka.items() ):
             return pre
     else: assert False
 
@@ -364,6 +421,59 @@ def create_shape_from_repr( repre ):
     Ty, ka = subshape_prefix_to_initializer(typre)
     return  Ty(*keypoints, ndivs = int(ndivs), **ka)
 
+def shapes_from_keypoints(prefix, keypoints, ndivs):
+    '''same as calling `create_shape_from_repr` on `m` shapes of the same kind (`prefix`, `ndivs`)
+    `keypoints`: (m, k, 2) array, the keypoints of each shape.
+    the divs of all the shapes are computed at once'''
+    Ty, ka = subshape_prefix_to_initializer(prefix)
+    keypoints = np.array(keypoints, dtype = float).reshape(len(keypoints), -1, 2)
+    m, k = keypoints.shape[:2]
+    if (k < 2) if Ty is PolyLine else (k != len(Ty._KEYPOINT_NAMES)):
+        raise TypeError(f"{Ty.__name__} can't have {k} keypoints")
+    if Ty is Point: ndivs = 1
+    #
+    def sqnorms(u): return (u ** 2).sum(-1)
+    def on_circle(centers, radii, angles): # angles: (m, ndivs)
+        return centers[:, None] + radii[:, None, None] * np.stack([np.cos(angles), np.sin(angles)], -1)
+    #
+    if Ty is Line:
+        divs = np.linspace(keypoints[:, 0], keypoints[:, 1], ndivs, axis = 1)
+    elif Ty is Circle:
+        centers, rels = keypoints[:, 0], keypoints[:, 1] - keypoints[:, 0]
+        radii = np.sqrt(sqnorms(rels))
+        starts = np.arctan2(rels[:, 1], rels[:, 0])
+        rot_dir = -1 if ka['clockwise'] else 1
+        divs = on_circle(centers, radii, np.linspace(starts, starts + 2 * pi * rot_dir, ndivs, False, axis = 1))
+        degenerate = radii < params.eps
+        divs[degenerate] = centers[degenerate, None]
+    elif Ty is Arc:
+        # (as in `Arc.__init__`) make start - center and end - center be the same size
+        centers, starts, ends = keypoints[:, 0], keypoints[:, 1], keypoints[:, 2]
+        rs, re = np.sqrt(sqnorms(starts - centers)), np.sqrt(sqnorms(ends - centers))
+        degenerate = (rs < params.eps) | (re < params.eps)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            ends[...] = centers + (ends - centers) * rs[:, None] / re[:, None]
+        starts[degenerate] = ends[degenerate] = centers[degenerate]
+        #
+        t1s = np.arctan2(*(starts - centers).T[::-1])
+        t2s = np.arctan2(*(ends - centers).T[::-1])
+        diffs = (t2s - t1s) % (2 * np.pi)
+        t2s = t1s + diffs - (2 * np.pi if ka['clockwise'] else 0)
+        divs = on_circle(centers, rs, np.linspace(t1s, t2s, ndivs, axis = 1))
+        divs[degenerate] = centers[degenerate, None]
+    else: # Point, PolyLine (see `set_divs_many`)
+        divs = keypoints[:, :1].copy()
+    #
+    flags = { 'loopy': Ty in (Circle, Point), **ka }
+    shapes = []
+    for sh_keypoints, sh_divs in zip(keypoints, divs):
+        sh = Ty.__new__(Ty)
+        sh.keypoints, sh.divs = sh_keypoints, sh_divs
+        for name, val in flags.items(): setattr(sh, name, val)
+        shapes.append(sh)
+    if Ty is PolyLine: set_divs_many(shapes, ndivs)
+    return shapes
+
 ################ WEAVE #################
 # needs its own module? 
 class Weave:
@@ -411,22 +521,83 @@ class Weave:
         new_hangpoints = [Rec(s = hg1.s, i = hg1.i), Rec(s = hg2.s, i = hg2.i)]
         return Weave(new_hangpoints, self.nwires, self.incrs)
     #
+    def wires(self):
+        '''endpoints of all the wires, as a (nwires, 2, 2) array
+        (stops at the first wire falling off a non-loopy shape)'''
+        n, idxs = self.nwires, []
+        for hg, incr in zip(self.hangpoints, self.incrs):
+            ndivs = len(hg.s.divs)
+            idx = hg.i + incr * np.arange(self.nwires)
+            if hg.s.loopy:
+                idx %= ndivs
+            elif (off := (idx < 0) | (idx >= ndivs)).any():
+                n = min(n, np.argmax(off))
+            idxs.append(idx)
+        [sh0, sh1] = (hg.s for hg in self.hangpoints)
+        return np.stack([sh0.divs[idxs[0][:n]], sh1.divs[idxs[1][:n]]], axis = 1)
+    #
     def draw(self, screen, view, color, antialias = True, width = 1):
-        def get_point(which, i):
-            hg = self.hangpoints[which]
-            return hg.s.get_div(hg.i + i * self.incrs[which])
-        #
-        for i in range(self.nwires):
-            a = get_point(0, i)
-            b = get_point(1, i)
-            if (a is None or b is None):
-                return
-            if width == 1 and antialias:
-                draw.aaline(screen, color, view.rtop(a), view.rtop(b))
-            else:
-                draw.line(screen, color, view.rtop(a), view.rtop(b), width = width)
+        return draw_weaves(screen, view, [self], [color], antialias, width)
     #
     def change_dir(self):
         inc0, inc1 = self.incrs
         self.incrs = (-inc0, -inc1)
     #
+
+def weaves_from_table(table, shapes1, shapes2):
+    '''same as creating `Weave([Rec(s = s1, i = i1), Rec(s = s2, i = i2)], n, (inc1, inc2))` for many weaves
+    `table`: (m, 5) int array, rows (n, inc1, inc2, i1, i2), `shapes1`, `shapes2`: the m shapes hung on
+    (the objects are filled in directly: at this scale the calls to `__init__` are most of the time)'''
+    table = np.asarray(table, dtype = int).reshape(-1, 5)
+    assert not ((table[:, 1] == 0) & (table[:, 2] == 0)).any()
+    ns, inc1s, inc2s, i1s, i2s = table.T.tolist()
+    new, weaves = object.__new__, []
+    for n, inc1, inc2, s1, i1, s2, i2 in zip(ns, inc1s, inc2s, shapes1, i1s, shapes2, i2s):
+        hg1, hg2, we = new(Rec), new(Rec), new(Weave)
+        hg1.__dict__, hg2.__dict__ = {'s': s1, 'i': i1}, {'s': s2, 'i': i2}
+        we.__dict__ = {'hangpoints': [hg1, hg2], 'nwires': n, 'incrs': (inc1, inc2)}
+        weaves.append(we)
+    return weaves
+
+def weave_wires(weaves):
+    '''the wires of all `weaves` as one (n, 2, 2) array of endpoints (see `Weave.wires`), 
+    + for each wire the index of its weave in `weaves`'''
+    wires = [we.wires() for we in weaves]
+    if not wires: return np.zeros((0, 2, 2)), np.zeros(0, dtype = int)
+    owners = np.repeat(np.arange(len(wires)), [len(ws) for ws in wires])
+    return np.concatenate(wires), owners
+
+def draw_weaves(screen, view, weaves, colors, antialias = True, width = 1):
+    '''draw `weaves` in one batch. (`colors[k]` is the color of `weaves[k]`)
+    return the bounding Rect of the drawn wires'''
+    wires, owners = weave_wires(weaves)
+    return draw_wires(screen, view.rtop_many(wires), owners, colors, antialias, width)
+
+def draw_wires(screen, pix, owners, colors, antialias = True, width = 1):
+    '''draw the wires `pix` ((n, 2, 2) pixel endpoints), the k-th with color `colors[owners[k]]`
+    the wires are culled (against the clip area of `screen`) as arrays,
+    so only the rasterization itself is left in the loop
+    return the bounding Rect of the drawn wires'''
+    if len(pix) == 0: return Rect(0, 0, 0, 0)
+    # cull wires that don't cross the clip area (grown by the line width)
+    clip, m = screen.get_clip(), width
+    lo, hi = ar(clip.topleft) - m, ar(clip.bottomright) + m
+    visible = ( (pix.max(1) >= lo) & (pix.min(1) < hi) ).all(1)
+    # (+ segments whose bounding box crosses it, but with all the corners on the same side)
+    a, ab = pix[:, 0], pix[:, 1] - pix[:, 0]
+    sides = [ np.sign(ab[:, 0] * (y - a[:, 1]) - ab[:, 1] * (x - a[:, 0])) 
+              for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) ]
+    visible &= np.abs(np.sum(sides, 0)) < 4
+    owners, pix = owners[visible], pix[visible]
+    if len(pix) == 0: return Rect(0, 0, 0, 0)
+    [left, top] = np.maximum(pix.min((0, 1)) - m, clip.topleft).tolist()
+    [right, bottom] = np.minimum(pix.max((0, 1)) + m + 1, clip.bottomright).tolist()
+    bound = Rect(left, top, right - left, bottom - top)
+    #
+    if width == 1 and antialias:
+        for k, (a, b) in zip(owners.tolist(), pix.tolist()):
+            draw.aaline(screen, colors[k], a, b)
+    else:
+        for k, (a, b) in zip(owners.tolist(), pix.tolist()):
+            draw.line(screen, colors[k], a, b, width = width)
+    return bound
@@ -0,0 +1,34 @@
+import numpy as np
+
+from .store import ShapeStore
+
+class NailIndex(ShapeStore):
+    '''Spatial index over the nails (divs) of a set of shapes.
+    Nails are kept sorted by x, so a radius query is 2 binary searches
+    + a vectorised filter over the vertical strip around the point.
+    The sorted copy is rebuilt from the store buffer whenever it is repacked'''
+    def _packed(self):
+        order = np.argsort(self.buffer[:, 0], kind = 'stable')
+        self._points, self._owners, self._divs = self.buffer[order], self.owners[order], self.indices[order]
+        self._xs = self._points[:, 0]
+    #
+    def query(self, point, radius):
+        '''find the nails within `radius` of `point`
+        return [(sqdist, shape, i), ...] with only the closest nail of each shape
+        (lowest i on ties), in indexing order'''
+        self.pack()
+        #
+        lo = np.searchsorted(self._xs, point[0] - radius, 'left')
+        hi = np.searchsorted(self._xs, point[0] + radius, 'right')
+        rels = self._points[lo:hi] - point
+        sqdists = np.einsum('ij,ij->i', rels, rels)
+        near = np.flatnonzero(sqdists <= radius ** 2)
+        if len(near) == 0: return []
+        #
+        owners, divs, sqdists = self._owners[lo:hi][near], self._divs[lo:hi][near], sqdists[near]
+        order = np.lexsort((divs, sqdists, owners))
+        owners, divs, sqdists = owners[order], divs[order], sqdists[order]
+        firsts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        return [ (float(d), self.shape_list[k], int(i))
+                 for (d, k, i) in zip(sqdists[firsts], owners[firsts], divs[firsts]) ]
+    ###
@@ -0,0 +1,131 @@
+import numpy as np
+
+class ShapeStore:
+    '''Keeps the nails (divs) of a set of shapes in one contiguous (n, 2) float64 `buffer`.
+    Once packed, the divs of the k-th shape are `buffer[offsets[k]:offsets[k] + lens[k]]`
+    and `shape.divs` *is* that view: in-place edits (eg `Shape.move`) go straight to the buffer,
+    and whole-design operations are single numpy calls on `buffer`.
+    Edits only mark the store dirty, it gets repacked when next needed.
+    `generation` is bumped on every edit (lets caches know when to recompute)'''
+    def __init__(self, shapes = ()):
+        self.generation = 0
+        self.reset(shapes)
+    #
+    def reset(self, shapes = ()):
+        self.shapes = {} # used as an ordered set
+        self.add(*shapes)
+    #
+    def add(self, *shapes):
+        for sh in shapes: self.shapes[sh] = None
+        self._touch()
+    #
+    def discard(self, *shapes):
+        for sh in shapes: self.shapes.pop(sh, None)
+        self._touch()
+    #
+    def update(self, *shapes):
+        "call after the nails of (already stored) `shapes` have been replaced (eg `set_divs`)"
+        self._touch()
+    #
+    def _touch(self):
+        self._dirty = True
+        self.generation += 1
+    #
+    def __len__(self):
+        return len(self.shapes)
+    #
+    def __iter__(self):
+        return iter(self.shapes)
+    #
+    def pack(self):
+        "(re)build the buffer if needed, and point every `shape.divs` into it. return self"
+        if not self._dirty: return self
+        self.shape_list = [*self.shapes]
+        self.lens = np.array([len(sh.divs) for sh in self.shape_list], dtype = int)
+        self.offsets = np.cumsum(self.lens) - self.lens
+        if self.shape_list:
+            self.buffer = np.concatenate([sh.divs for sh in self.shape_list]).astype(float)
+        else:
+            self.buffer = np.zeros((0, 2))
+        for sh, start, n in zip(self.shape_list, self.offsets.tolist(), self.lens.tolist()):
+            sh.divs = self.buffer[start:start + n]
+        # for each nail: index of its shape in `shape_list`, and its index on the shape
+        self.owners = np.repeat(np.arange(len(self.shape_list)), self.lens)
+        self.indices = np.arange(len(self.buffer)) - np.repeat(self.offsets, self.lens)
+        self._dirty = False
+        self._packed()
+        return self
+    #
+    def _packed(self):
+        "hook for subclasses, called after the buffer is rebuilt"
+        pass
+    #
+    def bounds(self):
+        "return vmin, vmax of all the nails"
+        self.pack()
+        return self.buffer.min(0), self.buffer.max(0)
+    #
+    def shapes_where(self, mask, every = False):
+        '''`mask`: one bool per nail of `buffer` (eg a test on the whole buffer)
+        return the shapes with any (or every) nail in `mask`'''
+        self.pack()
+        counts = np.bincount(self.owners, weights = mask, minlength = len(self.shape_list))
+        hits = (counts == self.lens) if every else (counts > 0)
+        return [ self.shape_list[k] for k in np.flatnonzero(hits) ]
+    ###
+
+class WeaveIndex:
+    '''shape -> weaves hanging on it (adjacency), + the draw order of each weave
+    lets selection operations find the weaves of a selection without scanning all of them.
+    call `add` on new weaves (or after moving their hangpoints, see `merge_into`),
+    `discard` on removed weaves, `to_top` when weaves are moved on top.
+    lookups skip weaves whose hangpoints have since moved to another shape'''
+    def __init__(self, weaves = ()):
+        self.generation = 0 # bumped on every edit
+        self.reset(weaves)
+    #
+    def reset(self, weaves = ()):
+        "`weaves`: in draw order"
+        self.generation += 1
+        self.on = {} # shape -> {weave: None} (ordered set)
+        self.rank = {} # weave -> draw order (increasing)
+        self._next_rank = 0
+        self.add(*weaves)
+    #
+    def add(self, *weaves):
+        self.generation += 1
+        for we in weaves:
+            if we not in self.rank: 
+                self.rank[we], self._next_rank = self._next_rank, self._next_rank + 1
+            for hg in we.hangpoints: self.on.setdefault(hg.s, {})[we] = None
+    #
+    def discard(self, *weaves):
+        self.generation += 1
+        for we in weaves:
+            if self.rank.pop(we, None) is None: continue
+            for hg in we.hangpoints: self.on.get(hg.s, {}).pop(we, None)
+    #
+    def forget(self, *shapes):
+        "`shapes` are gone (eg deleted or merged)"
+        for sh in shapes: self.on.pop(sh, None)
+    #
+    def to_top(self, weaves):
+        self.generation += 1
+        for we in weaves:
+            self.rank[we], self._next_rank = self._next_rank, self._next_rank + 1
+    #
+    def touching(self, shapes, inside = False):
+        '''weaves with an end (or both ends if `inside`) on one of `shapes`, in draw order
+        (`shapes`: preferably a set)'''
+        if not isinstance(shapes, (set, dict)): shapes = set(shapes)
+        found = {}
+        for sh in shapes:
+            for we in self.on.get(sh, ()):
+                [s1, s2] = [ hg.s for hg in we.hangpoints ]
+                if (s1 is not sh and s2 is not sh) or we not in self.rank: 
+                    continue # stale
+                if inside and not (s1 in shapes and s2 in shapes): 
+                    continue
+                found[we] = None
+        return sorted(found, key = self.rank.__getitem__)
+    ###
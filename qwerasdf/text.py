@@ -1,4 +1,5 @@
 from pygame import *
+from collections import OrderedDict
 
 from .params import params
 from .util import Rec
@@ -43,7 +44,9 @@ def _flatten1(l):
     return ret
 
 class TextArea:
-    def __init__(self, fontsize, width, bg, sections = {}):
+    # retained: `surf` is only rebuilt when a section's content changes (otherwise `render` returns the same Surface),
+    # and the rendered lines are kept in a LRU cache (by text and color)
+    def __init__(self, fontsize, width, bg, sections = {}, cache_size = 256):
         self.width = width
         self.sections = sections
         #
@@ -51,19 +54,23 @@ class TextArea:
         self.ch_dim = self.font.size('x')
         self.bg = bg
         self.surf = None
+        self.line_cache = OrderedDict() # (text, rgb) -> Surface
+        self.cache_size = cache_size
     #
     def set_sections_abcw(self, sections):
         self.sections = { 
                 name: Section(a, b, c, w) 
                 for (name, ((a, b), c, w)) in sections.items() }
+        self.surf = None
     #
     def set_width(self, width):
         self.width = width
-        self._render()
+        self.surf = None
     #
     def write_section(self, section, lines):
+        if self.sections[section].lines == lines: return
         self.sections[section].lines = lines
-        self._render()
+        self.surf = None
     #
     def display_lines(self, section):
         lines = self.sections[section].lines
@@ -88,10 +95,18 @@ class TextArea:
         surf = Surface((self.width, len(colorlines) * self.ch_dim[1]))
         surf.fill(self.bg)
         for i, (line, color) in enumerate(colorlines):
-            s = self.font.render(line, True, color, self.bg)
-            surf.blit(s, (0, i * self.ch_dim[1]))
+            if line: surf.blit(self._render_line(line, color), (0, i * self.ch_dim[1]))
         self.surf = surf
         return surf
+    #
+    def _render_line(self, line, color):
+        key = (line, tuple(color))
+        if key in self.line_cache:
+            self.line_cache.move_to_end(key)
+        else:
+            self.line_cache[key] = self.font.render(line, True, color, self.bg)
+            if len(self.line_cache) > self.cache_size: self.line_cache.popitem(last = False)
+        return self.line_cache[key]
     # 
     def render(self):
         if not self.surf: self._render()
@@ -5,6 +5,8 @@ from .util import clamp
 from .math_utils import ar
 
 class View:
+    mirrors = False # see `AffineView`
+    #
     def __init__(self, corner = (0,0), ppu = 500):
         self.corner = ar(corner)
         self.ppu = int(ppu)
@@ -33,6 +35,25 @@ class View:
     def rtopd(self, rd):
         return int(rd * self.ppu)
     #
+    # array versions: take (..., 2) arrays of points (or arrays of distances)
+    def ptor_many(self, pps):
+        "pixel to real; array"
+        return self.corner + np.asarray(pps, dtype = float) * ar((1, -1)) / self.ppu
+    #
+    def rtop_many(self, rps):
+        "real to pixel; array (same rounding as `rtop`)"
+        pps = ((np.asarray(rps) - self.corner) * self.ppu).astype(int)
+        pps[..., 1] *= -1
+        return pps
+    #
+    def rtopd_many(self, rds):
+        "real to pixel; array of distances"
+        return (np.asarray(rds) * self.ppu).astype(int)
+    #
+    def rvec(self, rv):
+        "direction of real vector `rv` once drawn (unchanged here, see `AffineView`)"
+        return rv
+    #
     def rzoom(self, rcenter, factor):
         self.ppu *= factor
         if not (params.min_ppu <= self.ppu <= params.max_ppu):
@@ -51,3 +72,29 @@ class View:
         self.rmove( self.ptor(pmotion) )
     ###
 
+class AffineView:
+    '''`view` of the plane moved by the similarity `p -> matrix @ (p - center) + center + offset`
+    ie drawing shapes through it draws them as if transformed, without transforming (copying) them.
+    `mirrors`: the similarity reverses orientation (clockwise shapes must be drawn counterclockwise)'''
+    def __init__(self, view, matrix = None, center = (0, 0), offset = (0, 0)):
+        self.view, self.center, self.offset = view, ar(center), ar(offset)
+        self.matrix = np.identity(2) if matrix is None else ar(matrix)
+        [[a, b], [c, d]] = self.matrix
+        det = a * d - b * c
+        self.scale, self.mirrors = abs(det) ** 0.5, det < 0
+    #
+    def _apply(self, rps):
+        return (np.asarray(rps) - self.center) @ self.matrix.T + self.center + self.offset
+    #
+    def rtop(self, rp):
+        return self.view.rtop(self._apply(rp))
+    #
+    def rtop_many(self, rps):
+        return self.view.rtop_many(self._apply(rps))
+    #
+    def rtopd(self, rd):
+        return self.view.rtopd(rd * self.scale)
+    #
+    def rvec(self, rv):
+        return self.view.rvec(self.matrix @ rv)
+    ###